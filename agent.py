@@ -1,14 +1,14 @@
 import asyncio
 from collections import OrderedDict
 from dataclasses import dataclass, field
-import time, importlib, inspect, os, json
+import time, importlib, inspect, os, json, threading
 import token
 from typing import Any, Awaitable, Coroutine, Optional, Dict, TypedDict
 import uuid
 import models
 
 from langchain_core.prompt_values import ChatPromptValue
-from python.helpers import extract_tools, rate_limiter, files, errors, history, tokens
+from python.helpers import extract_tools, rate_limiter, files, errors, history, tokens, scheduler
 from python.helpers.print_style import PrintStyle
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
@@ -20,11 +20,18 @@ from python.helpers.dirty_json import DirtyJson
 from python.helpers.defer import DeferredTask
 from typing import Callable
 
+CONTEXTS_LENGTH_INTERVAL = 5  # seconds, log lengths in the contexts summary are refreshed at most this often
+
 
 class AgentContext:
 
     _contexts: dict[str, "AgentContext"] = {}
     _counter: int = 0
+    # version of the contexts summary clients list, see contexts_changed
+    _version: int = 0
+    _version_lock = threading.Lock()
+    _lengths_pending = False  # log lengths changed since the version last changed
+    _lengths_counted = 0.0  # when log length changes last bumped the version
 
     def __init__(
         self,
@@ -35,23 +42,118 @@ class AgentContext:
         log: Log.Log | None = None,
         paused: bool = False,
         streaming_agent: "Agent|None" = None,
+        no: int = 0,
     ):
         # build context
         self.id = id or str(uuid.uuid4())
-        self.name = name
+        self._name = name
         self.config = config
         self.log = log or Log.Log()
+        self.log.on_length_change = AgentContext.log_length_changed
         self.agent0 = agent0 or Agent(0, self.config, self)
-        self.paused = paused
+        self._signal_lock = threading.Lock()
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._paused = paused
         self.streaming_agent = streaming_agent
         self.task: DeferredTask | None = None
-        AgentContext._counter += 1
-        self.no = AgentContext._counter
+        if no:
+            # number given to a persisted chat before it was loaded
+            AgentContext._counter = max(AgentContext._counter, no)
+            self.no = no
+        else:
+            AgentContext._counter += 1
+            self.no = AgentContext._counter
 
         existing = self._contexts.get(self.id, None)
         if existing:
             AgentContext.remove(self.id)
         self._contexts[self.id] = self
+        AgentContext.contexts_changed()
+
+    @property
+    def name(self) -> str | None:
+        return self._name
+
+    @name.setter
+    def name(self, value: str | None):
+        if value != self._name:
+            self._name = value
+            AgentContext.contexts_changed()
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, value: bool):
+        with self._signal_lock:
+            changed = value != self._paused
+            self._paused = value
+        if not value:
+            self.signal()
+        if changed:
+            # not shown in the chats list, clients of other contexts get it with their next answer
+            AgentContext.contexts_changed(wake=False)
+            self.log.notify()
+
+    @staticmethod
+    def contexts_changed(wake: bool = True):
+        """Bump the contexts summary version when a context is created, removed, paused or renamed.
+        With wake, clients waiting on any context are answered so they show the new chats list."""
+        with AgentContext._version_lock:
+            AgentContext._version += 1
+            AgentContext._lengths_pending = False  # lists from now on have the current lengths
+        if wake:
+            for context in list(AgentContext._contexts.values()):
+                context.log.notify()
+
+    @staticmethod
+    def log_length_changed():
+        # logs grow with every item while a chat runs, the lengths are put into the version
+        # when it is read, at most every CONTEXTS_LENGTH_INTERVAL seconds and without waking anyone
+        AgentContext._lengths_pending = True
+
+    @staticmethod
+    def get_contexts_version() -> int:
+        with AgentContext._version_lock:
+            now = time.time()
+            if (
+                AgentContext._lengths_pending
+                and now - AgentContext._lengths_counted >= CONTEXTS_LENGTH_INTERVAL
+            ):
+                AgentContext._version += 1
+                AgentContext._lengths_pending = False
+                AgentContext._lengths_counted = now
+            return AgentContext._version
+
+    def signal(self):
+        """Wake all agents waiting in this context, safe to call from any thread."""
+        with self._signal_lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    async def wait_if_paused(self):
+        """Wait until the context is resumed, without polling."""
+        await self.wait_for_signal(lambda: not self._paused)
+
+    async def wait_for_signal(self, until: Callable[[], bool]):
+        """Wait until the condition holds, it is checked again whenever the context is signalled.
+        Resuming and messages sent to a running chat signal the context."""
+        while not until():
+            waiter = (asyncio.get_running_loop(), asyncio.Event())
+            with self._signal_lock:
+                if until():
+                    break
+                self._waiters.add(waiter)
+            try:
+                await waiter[1].wait()
+            finally:
+                with self._signal_lock:
+                    self._waiters.discard(waiter)
 
     @staticmethod
     def get(id: str):
@@ -68,6 +170,10 @@ class AgentContext:
         context = AgentContext._contexts.pop(id, None)
         if context and context.task:
             context.task.kill()
+        if context:
+            context.log.notify()  # answer clients waiting on the removed chat
+            AgentContext.contexts_changed()
+        scheduler.forget_context(id)
         return context
 
     def kill_process(self):
@@ -93,8 +199,6 @@ class AgentContext:
         return self.task
 
     def communicate(self, msg: "UserMessage", broadcast_level: int = 1):
-        self.paused = False  # unpause if paused
-
         if self.streaming_agent:
             current_agent = self.streaming_agent
         else:
@@ -109,7 +213,9 @@ class AgentContext:
                 intervention_agent = intervention_agent.data.get(
                     Agent.DATA_NAME_SUPERIOR, None
                 )
+            self.paused = False  # unpause if paused, waiting agents pick up the intervention
         else:
+            self.paused = False  # unpause if paused
             self.task = self.run_task(self._process_chain, current_agent, msg)
 
         return self.task
@@ -117,10 +223,13 @@ class AgentContext:
     def run_task(
         self, func: Callable[..., Coroutine[Any, Any, Any]], *args: Any, **kwargs: Any
     ):
-        if not self.task:
-            self.task = DeferredTask(
-                thread_name=self.__class__.__name__,
-            )
+        # contexts are spread over several event loops, a context can move between tasks
+        thread_name = scheduler.get_thread_name(self.id)
+        if not self.task or (
+            not self.task.is_alive()
+            and self.task.event_loop_thread.thread_name != thread_name
+        ):
+            self.task = DeferredTask(thread_name=thread_name)
         self.task.start_task(func, *args, **kwargs)
         return self.task
 
@@ -181,6 +290,8 @@ class AgentConfig:
     code_exec_ssh_port: int = 55022
     code_exec_ssh_user: str = "root"
     code_exec_ssh_pass: str = ""
+    early_tool_dispatch: bool = False  # stop generating and run the tool once its JSON closes
+    tools_concurrency: int = 3  # max concurrent tools from one response
     additional: Dict[str, Any] = field(default_factory=dict)
 
 
@@ -224,6 +335,7 @@ class Agent:
 
     DATA_NAME_SUPERIOR = "_superior"
     DATA_NAME_SUBORDINATE = "_subordinate"
+    DATA_NAME_PARALLEL = "_parallel"
     DATA_NAME_CTX_WINDOW = "ctx_window"
 
     def __init__(
@@ -244,6 +356,7 @@ class Agent:
         self.last_user_message: history.Message | None = None
         self.intervention: UserMessage | None = None
         self.data = {}  # free data object all the tools can use
+        self.data_revision = 0  # bumped by set_data, saves serialize the data only after it changed
 
     async def monologue(self):
         while True:
@@ -258,7 +371,8 @@ class Agent:
                 # let the agent run message loop until he stops it with a response tool
                 while True:
 
-                    self.context.streaming_agent = self  # mark self as current streamer
+                    if not self.get_data(Agent.DATA_NAME_PARALLEL):
+                        self.context.streaming_agent = self  # mark self as current streamer
                     self.loop_data.iteration += 1
 
                     try:
@@ -276,11 +390,20 @@ class Agent:
                             type="agent", heading=f"{self.agent_name}: Generating"
                         )
 
+                        # incremental parser of this response, resumes with every chunk
+                        parser = DirtyJson()
+
                         async def stream_callback(chunk: str, full: str):
                             # output the agent response stream
                             if chunk:
                                 printer.stream(chunk)
-                                self.log_from_stream(full, log)
+                                parser.feed(chunk)
+                                self.log_from_stream(full, log, parser)
+                            # stop generating once the tool request is complete
+                            return (
+                                self.config.early_tool_dispatch
+                                and self.is_tool_request_complete(parser)
+                            )
 
                         # store as last context window content
                         self.set_data(Agent.DATA_NAME_CTX_WINDOW, prompt.format())
@@ -289,6 +412,13 @@ class Agent:
                             prompt, callback=stream_callback
                         )
 
+                        # drop anything generated after the tool request
+                        if (
+                            self.config.early_tool_dispatch
+                            and self.is_tool_request_complete(parser)
+                        ):
+                            agent_response = agent_response[: parser.end]
+
                         await self.handle_intervention(agent_response)
 
                         if (
@@ -337,7 +467,8 @@ class Agent:
             except Exception as e:
                 self.handle_critical_exception(e)
             finally:
-                self.context.streaming_agent = None  # unset current streamer
+                if not self.get_data(Agent.DATA_NAME_PARALLEL):
+                    self.context.streaming_agent = None  # unset current streamer
                 # call monologue_end extensions
                 await self.call_extensions("monologue_end", loop_data=self.loop_data)  # type: ignore
 
@@ -435,6 +566,7 @@ class Agent:
 
     def set_data(self, field: str, value):
         self.data[field] = value
+        self.data_revision += 1
 
     def hist_add_message(self, ai: bool, content: history.MessageContent):
         return self.history.add_message(ai=ai, content=content)
@@ -561,7 +693,7 @@ class Agent:
     async def call_chat_model(
         self,
         prompt: ChatPromptTemplate,
-        callback: Callable[[str, str], Awaitable[None]] | None = None,
+        callback: Callable[[str, str], Awaitable[bool | None]] | None = None,
     ):
         response = ""
 
@@ -571,15 +703,21 @@ class Agent:
         # rate limiter
         limiter = await self.rate_limiter(self.config.chat_model, prompt.format())
 
-        async for chunk in (prompt | model).astream({}):
-            await self.handle_intervention()  # wait for intervention and handle it, if paused
+        stream = (prompt | model).astream({})
+        try:
+            async for chunk in stream:
+                await self.handle_intervention()  # wait for intervention and handle it, if paused
 
-            content = models.parse_chunk(chunk)
-            limiter.add(output=tokens.approximate_tokens(content))
-            response += content
+                content = models.parse_chunk(chunk)
+                limiter.add(output=tokens.approximate_tokens(content))
+                response += content
 
-            if callback:
-                await callback(content, response)
+                # callback can stop the generation by returning True
+                if callback and await callback(content, response):
+                    break
+        finally:
+            # cancel the rest of the generation if it was stopped early
+            await stream.aclose()  # type: ignore
 
         return response
 
@@ -616,8 +754,7 @@ class Agent:
         return limiter
 
     async def handle_intervention(self, progress: str = ""):
-        while self.context.paused:
-            await asyncio.sleep(0.1)  # wait if paused
+        await self.context.wait_if_paused()  # wait if paused
         if (
             self.intervention
         ):  # if there is an intervention message, but not yet processed
@@ -630,27 +767,31 @@ class Agent:
             raise InterventionException(msg)
 
     async def wait_if_paused(self):
-        while self.context.paused:
-            await asyncio.sleep(0.1)
+        await self.context.wait_if_paused()
 
     async def process_tools(self, msg: str):
-        # search for tool usage requests in agent message
-        tool_request = extract_tools.json_parse_dirty(msg)
-
-        if tool_request is not None:
-            tool_name = tool_request.get("tool_name", "")
-            tool_args = tool_request.get("tool_args", {})
-            tool = self.get_tool(tool_name, tool_args, msg)
+        # search for tool usage requests in agent message, one object or an array of them
+        tool_requests = extract_tools.json_parse_dirty_list(msg)
 
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            await tool.before_execution(**tool_args)
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            response = await tool.execute(**tool_args)
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            await tool.after_execution(response)
-            await self.handle_intervention()  # wait if paused and handle intervention message if needed
-            if response.break_loop:
-                return response.message
+        if tool_requests:
+            tools = [
+                self.get_tool(
+                    request.get("tool_name", ""), request.get("tool_args", {}), msg
+                )
+                for request in tool_requests
+            ]
+            # consecutive concurrent tools run together, others one by one in order
+            batches: list[list] = []
+            for tool in tools:
+                if tool.concurrent and batches and batches[-1][-1].concurrent:
+                    batches[-1].append(tool)
+                else:
+                    batches.append([tool])
+
+            for batch in batches:
+                result = await self.execute_tools(batch)
+                if result is not None:
+                    return result
         else:
             msg = self.read_prompt("fw.msg_misformat.md")
             await self.hist_add_warning(msg)
@@ -659,14 +800,53 @@ class Agent:
                 type="error", content=f"{self.agent_name}: Message misformat"
             )
 
-    def log_from_stream(self, stream: str, logItem: Log.LogItem):
+    async def execute_tools(self, tools: list):
+        limiter = asyncio.Semaphore(max(1, self.config.tools_concurrency))
+
+        async def execute(tool):
+            async with limiter:
+                await self.handle_intervention()  # wait if paused and handle intervention message if needed
+                return await tool.execute(**tool.args)
+
+        for tool in tools:
+            await self.handle_intervention()  # wait if paused and handle intervention message if needed
+            await tool.before_execution(**tool.args)
+
+        responses = await asyncio.gather(
+            *[execute(tool) for tool in tools], return_exceptions=True
+        )
+
+        # results go to history in the order of the requests
+        for tool, response in zip(tools, responses):
+            if isinstance(response, BaseException):
+                raise response
+            await self.handle_intervention()  # wait if paused and handle intervention message if needed
+            await tool.after_execution(response)
+            await self.handle_intervention()  # wait if paused and handle intervention message if needed
+            if response.break_loop:
+                return response.message
+
+    def is_tool_request_complete(self, parser: DirtyJson) -> bool:
+        # top-level object (or array of objects) of the response is closed and names tools
+        if not parser.closed:
+            return False
+        requests = parser.result if isinstance(parser.result, list) else [parser.result]
+        return bool(requests) and all(
+            isinstance(request, dict)
+            and isinstance(request.get("tool_name", None), str)
+            and bool(request["tool_name"].strip())
+            for request in requests
+        )
+
+    def log_from_stream(self, stream: str, logItem: Log.LogItem, parser: DirtyJson):
         try:
             if len(stream) < 25:
                 return  # no reason to try
-            response = DirtyJson.parse_string(stream)
+            response = parser.result
             if isinstance(response, dict):
-                # log if result is a dictionary already
-                logItem.update(content=stream, kvps=response)
+                # log if result is a dictionary already, copy as the parser keeps updating it,
+                # values complete in the logged copy are shared so only the streamed tail is copied
+                logItem.update(content=stream, kvps=parser.copy_result(logItem.kvps))
         except Exception as e:
             pass
 
@@ -674,16 +854,14 @@ class Agent:
         from python.tools.unknown import Unknown
         from python.helpers.tool import Tool
 
-        classes = extract_tools.load_classes_from_folder(
-            "python/tools", name + ".py", Tool
-        )
+        classes = extract_tools.get_cached_classes("python/tools", name + ".py", Tool)
         tool_class = classes[0] if classes else Unknown
         return tool_class(agent=self, name=name, args=args, message=message, **kwargs)
 
     async def call_extensions(self, folder: str, **kwargs) -> Any:
         from python.helpers.extension import Extension
 
-        classes = extract_tools.load_classes_from_folder(
+        classes = extract_tools.get_cached_classes(
             "python/extensions/" + folder, "*", Extension
         )
         for cls in classes:
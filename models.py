@@ -1,5 +1,10 @@
+import asyncio
+from collections import OrderedDict
 from enum import Enum
+import hashlib
+import json
 import os
+import threading
 from typing import Any
 from langchain_openai import (
     ChatOpenAI,
@@ -30,6 +35,7 @@ from langchain_mistralai import ChatMistralAI
 # from pydantic.v1.types import SecretStr
 from python.helpers import dotenv, runtime
 from python.helpers.dotenv import load_dotenv
+from python.helpers.offline_model import OfflineChat, OfflineEmbeddings
 from python.helpers.rate_limiter import RateLimiter
 
 # environment variables
@@ -49,6 +55,7 @@ class ModelProvider(Enum):
     HUGGINGFACE = "HuggingFace"
     LMSTUDIO = "LM Studio"
     MISTRALAI = "Mistral AI"
+    OFFLINE = "Offline (testing)"
     OLLAMA = "Ollama"
     OPENAI = "OpenAI"
     OPENAI_AZURE = "OpenAI Azure"
@@ -59,6 +66,11 @@ class ModelProvider(Enum):
 
 rate_limiters: dict[str, RateLimiter] = {}
 
+# model instances are reused to keep their HTTP clients and connection pools
+MODEL_CACHE_SIZE = 16
+models_cache: OrderedDict[str, Any] = OrderedDict()
+models_cache_lock = threading.Lock()
+
 
 # Utility function to get API keys from environment variables
 def get_api_key(service):
@@ -70,11 +82,42 @@ def get_api_key(service):
 
 
 def get_model(type: ModelType, provider: ModelProvider, name: str, **kwargs):
+    key = get_model_key(type, provider, name, **kwargs)
+    with models_cache_lock:
+        model = models_cache.get(key, None)
+        if model is not None:
+            models_cache.move_to_end(key)
+            return model
+
     fnc_name = f"get_{provider.name.lower()}_{type.name.lower()}"  # function name of model getter
     model = globals()[fnc_name](name, **kwargs)  # call function by name
+
+    with models_cache_lock:
+        models_cache[key] = model
+        while len(models_cache) > MODEL_CACHE_SIZE:
+            models_cache.popitem(last=False)  # drop least recently used
     return model
 
 
+def get_model_key(type: ModelType, provider: ModelProvider, name: str, **kwargs):
+    kwargs_json = json.dumps(kwargs, sort_keys=True, default=str)
+    kwargs_hash = hashlib.sha256(kwargs_json.encode()).hexdigest()
+    return f"{_get_loop_key()}\\{type.name}\\{provider.name}\\{name}\\{kwargs_hash}"
+
+
+def _get_loop_key():
+    # async clients are bound to the event loop they were created on, agent contexts run on several loops
+    try:
+        return str(id(asyncio.get_running_loop()))
+    except RuntimeError:
+        return "sync"
+
+
+def clear_model_cache():
+    with models_cache_lock:
+        models_cache.clear()
+
+
 def get_rate_limiter(
     provider: ModelProvider, name: str, requests: int, input: int, output: int
 ) -> RateLimiter:
@@ -135,6 +178,15 @@ def get_ollama_embedding(
     )
 
 
+# Offline deterministic models for testing and benchmarks, kwargs: responses, responses_file, ttft, tokens_per_second
+def get_offline_chat(model_name: str, **kwargs):
+    return OfflineChat(model_name=model_name, **kwargs)
+
+
+def get_offline_embedding(model_name: str, **kwargs):
+    return OfflineEmbeddings(model_name=model_name, **kwargs)
+
+
 # HuggingFace models
 def get_huggingface_chat(
     model_name: str,
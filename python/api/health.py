@@ -2,7 +2,7 @@ from python.helpers.api import ApiHandler
 from flask import Request, Response
 from python.helpers import errors
 
-from python.helpers import git
+from python.helpers import git, history, scheduler
 
 class HealthCheck(ApiHandler):
 
@@ -14,4 +14,9 @@ class HealthCheck(ApiHandler):
         except Exception as e:
             error = errors.error_text(e)
 
-        return {"gitinfo": gitinfo, "error": error}
+        return {
+            "gitinfo": gitinfo,
+            "error": error,
+            "loops": scheduler.get_metrics(),
+            "history_compression": history.get_compression_metrics(),
+        }
@@ -1,4 +1,3 @@
-from python.helpers import tokens
 from python.helpers.api import ApiHandler
 from flask import Request, Response
 
@@ -9,7 +8,7 @@ class GetHistory(ApiHandler):
         context = self.get_context(ctxid)
         agent = context.streaming_agent or context.agent0
         history = agent.history.output()
-        size = tokens.approximate_tokens(agent.history.output_text())
+        size = agent.history.get_tokens()
 
         return {
             "history": history,
@@ -1,40 +1,88 @@
+import hashlib
+import json
+import uuid
+
 from python.helpers.api import ApiHandler
 from flask import Request, Response
 
 from agent import AgentContext
+from python.helpers import persist_chat
+
+# contexts versions of this process, the prefix keeps them from matching versions a client got before a restart
+_VERSION_PREFIX = uuid.uuid4().hex[:8]
 
 class Poll(ApiHandler):
     async def process(self, input: dict, request: Request) -> dict | Response:
         ctxid = input.get("context", None)
-        from_no = input.get("log_from", 0)
 
         # context instance - get or create
         context = self.get_context(ctxid)
 
-        logs = context.log.output(start=from_no)
-
-        # loop AgentContext._contexts
-        ctxs = []
-        for ctx in AgentContext._contexts.values():
-            ctxs.append(
-                {
-                    "id": ctx.id,
-                    "no": ctx.no,
-                    "log_guid": ctx.log.guid,
-                    "log_version": len(ctx.log.updates),
-                    "log_length": len(ctx.log.logs),
-                    "paused": ctx.paused,
-                }
-            )
-
-        # data from this server
-        return {
-            "context": context.id,
-            "contexts": ctxs,
-            "logs": logs,
-            "log_guid": context.log.guid,
-            "log_version": len(context.log.updates),
-            "log_progress": context.log.progress,
-            "log_progress_active": context.log.progress_active,
-            "paused": context.paused,
-        }
\ No newline at end of file
+        output = get_poll_output(context, input)
+        return get_conditional_response(output, request.headers.get("If-None-Match", ""))
+
+
+def get_poll_output(context: AgentContext, input: dict) -> dict:
+    from_no = input.get("log_from", 0)
+    log_deltas = input.get("log_deltas", False)  # client merges appended text into its copies
+    contexts_version = get_contexts_version()
+
+    logs = context.log.output(start=from_no, delta=log_deltas)
+
+    # data from this server
+    output = {
+        "context": context.id,
+        "contexts_version": contexts_version,
+        "logs": logs,
+        "log_guid": context.log.guid,
+        "log_version": context.log.version,
+        "log_progress": context.log.progress,
+        "log_progress_active": context.log.progress_active,
+        "paused": context.paused,
+    }
+    # the list only when the client's copy is older, read after the version so it is never older itself
+    if input.get("contexts_version", None) != contexts_version:
+        output["contexts"] = get_contexts_output()
+    return output
+
+
+def get_contexts_version() -> str:
+    return f"{_VERSION_PREFIX}-{AgentContext.get_contexts_version()}"
+
+
+def get_conditional_response(output: dict, if_none_match: str) -> Response:
+    # etag of the whole payload, 304 when the client has it already
+    body = json.dumps(output)
+    etag = '"' + hashlib.blake2b(body.encode(), digest_size=16).hexdigest() + '"'
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status=304, headers={"ETag": etag})
+    return Response(response=body, status=200, mimetype="application/json", headers={"ETag": etag})
+
+
+def get_contexts_output():
+    # loop AgentContext._contexts
+    ctxs = []
+    for ctx in list(AgentContext._contexts.values()):
+        ctxs.append(
+            {
+                "id": ctx.id,
+                "no": ctx.no,
+                "name": ctx.name,
+                "log_guid": ctx.log.guid,
+                "log_length": len(ctx.log.logs),
+                "paused": ctx.paused,
+            }
+        )
+    # persisted chats not loaded yet, from their index info
+    for info in persist_chat.get_chat_index():
+        ctxs.append(
+            {
+                "id": info.id,
+                "no": info.no,
+                "name": info.name,
+                "log_guid": info.log_guid,
+                "log_length": info.log_length,
+                "paused": False,
+            }
+        )
+    return ctxs
@@ -0,0 +1,40 @@
+from python.helpers.api import ApiHandler
+from flask import Request, Response
+
+from agent import AgentContext
+from python.api.poll import get_conditional_response, get_contexts_version, get_poll_output
+
+WAIT_TIMEOUT = 25  # seconds, below common proxy idle timeouts, the client asks again right away
+
+
+class PollWait(ApiHandler):
+    """Long poll, answers like /poll as soon as the context has something the client does not,
+    or with nothing new when the timeout runs out."""
+
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        ctxid = input.get("context", None)
+        from_no = input.get("log_from", 0)
+        log_guid = input.get("log_guid", "")
+        paused = input.get("paused", None)
+        progress = input.get("log_progress", None)
+        progress_active = input.get("log_progress_active", None)
+        contexts_version = input.get("contexts_version", None)
+
+        context = self.get_context(ctxid)
+        log = context.log
+
+        def changed():
+            return (
+                context.id != ctxid
+                or AgentContext.get(context.id) is not context  # removed meanwhile
+                or log.guid != log_guid
+                or log.version > from_no
+                or (paused is not None and context.paused != paused)
+                or (progress is not None and log.progress != progress)
+                or (progress_active is not None and log.progress_active != progress_active)
+                or (contexts_version is not None and get_contexts_version() != contexts_version)
+            )
+
+        await log.wait_for_change(changed, WAIT_TIMEOUT)
+        output = get_poll_output(context, input)
+        return get_conditional_response(output, request.headers.get("If-None-Match", ""))
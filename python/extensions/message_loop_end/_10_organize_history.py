@@ -1,4 +1,6 @@
 import asyncio
+import time
+from python.helpers import history
 from python.helpers.extension import Extension
 from agent import LoopData
 
@@ -12,7 +14,20 @@ class OrganizeHistory(Extension):
         if task and not task.done():
             return
 
+        # compress early in the background once the history passes the watermark, so the next turn does not have to wait
+        if not self.agent.history.is_over_watermark():
+            return
+
         # start task
-        task = asyncio.create_task(self.agent.history.compress())
+        task = asyncio.create_task(self.compress())
         # set to agent to be able to wait for it
         self.agent.set_data(DATA_NAME_TASK, task)
+
+    async def compress(self):
+        start = time.monotonic()
+        try:
+            return await self.agent.history.compress(
+                history.get_ctx_watermark_for_history()
+            )
+        finally:
+            history.record_background_compression(time.monotonic() - start)
@@ -5,4 +5,5 @@ from python.helpers import persist_chat
 
 class SaveChat(Extension):
     async def execute(self, loop_data: LoopData = LoopData(), **kwargs):
-        persist_chat.save_tmp_chat(self.agent.context)
\ No newline at end of file
+        # coalesced with the next iterations, written off the event loop
+        persist_chat.schedule_save(self.agent.context)
\ No newline at end of file
@@ -6,6 +6,7 @@ from attr import dataclass
 from flask import Request, Response, jsonify, Flask
 from agent import AgentContext
 from initialize import initialize
+from python.helpers import persist_chat
 from python.helpers.print_style import PrintStyle
 from python.helpers.errors import format_error
 from werkzeug.serving import make_server
@@ -57,8 +58,16 @@ class ApiHandler:
                 first = AgentContext.first()
                 if first:
                     return first
+                for info in persist_chat.get_chat_index():
+                    try:
+                        loaded = persist_chat.load_chat(info.id)
+                    except Exception:
+                        continue  # logged by load_chat, try the next one
+                    if loaded:
+                        return loaded
                 return AgentContext(config=initialize())
-            got = AgentContext.get(ctxid)
+            # persisted chats are loaded on first access, one that cannot be read raises instead of being replaced
+            got = AgentContext.get(ctxid) or persist_chat.load_chat(ctxid)
             if got:
                 return got
             return AgentContext(config=initialize(), id=ctxid)
@@ -0,0 +1,222 @@
+import hashlib
+import io
+import json
+import struct
+import zlib
+from typing import Any, BinaryIO, Callable
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for snapshots written with zstd
+    zstandard = None
+
+# binary chat snapshot
+# header: magic, format version
+# then records: type, compression, payload length, payload (json, compressed when large)
+# record order: context, agents, current topics of all agents, past history of all agents, log
+# contents are stored once as blob records right before the first record using them,
+# so every record can be unpacked as soon as it is read
+
+MAGIC = b"A0CS"
+VERSION = 1
+COMPRESS_MIN_SIZE = 1024  # bytes of payload, smaller records are stored plain
+BLOB_MIN_SIZE = 256  # bytes of encoded content, smaller contents stay inline
+
+RECORD_CONTEXT = 1
+RECORD_AGENT = 2
+RECORD_BLOB = 3
+RECORD_CURRENT = 4
+RECORD_PAST = 5
+RECORD_LOG = 6
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+_HEADER = struct.Struct("<4sB")
+_RECORD = struct.Struct("<BBI")
+
+# fields holding contents worth deduplicating, tool outputs mostly
+_BLOB_FIELDS = ("content", "summary")
+_BLOB_SUFFIX = "_blob"
+
+
+def encode(
+    data: dict,
+    compression: int = COMPRESSION_ZLIB,
+    default: Callable[[Any], Any] | None = None,
+) -> bytes:
+    """Encode a serialized chat (as from persist_chat._serialize_context, histories as dicts).
+    zlib is readable everywhere, zstd needs zstandard wherever the snapshot is read.
+    default is the json.dumps fallback for values json cannot encode."""
+    if compression == COMPRESSION_ZSTD and not zstandard:
+        raise ValueError("zstd compression needs zstandard installed")
+    out = io.BytesIO()
+    out.write(_HEADER.pack(MAGIC, VERSION))
+    writer = _Writer(out, compression, default)
+
+    agents = data.get("agents", [])
+    context = {k: v for k, v in data.items() if k not in ("agents", "log")}
+    writer.write(RECORD_CONTEXT, context)
+    for agent in agents:
+        writer.write(RECORD_AGENT, {"number": agent["number"], "data": agent.get("data", {})})
+    for i, agent in enumerate(agents):
+        history = agent.get("history") or {}
+        current = writer.pack_record(history.get("current", None))
+        writer.write(RECORD_CURRENT, {"agent": i, "current": current})
+    for i, agent in enumerate(agents):
+        history = agent.get("history") or {}
+        bulks = [writer.pack_record(b) for b in history.get("bulks", [])]
+        topics = [writer.pack_record(t) for t in history.get("topics", [])]
+        writer.write(RECORD_PAST, {"agent": i, "bulks": bulks, "topics": topics})
+    log = data.get("log", None)
+    if log is not None:
+        logs = [writer.pack_fields(item) for item in log.get("logs", [])]
+        writer.write(RECORD_LOG, {**log, "logs": logs})
+    return out.getvalue()
+
+
+def read(file: BinaryIO) -> dict:
+    """Stream a snapshot back into the serialized chat structure."""
+    magic, version = _HEADER.unpack(file.read(_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a chat snapshot")
+    if version > VERSION:
+        raise ValueError(f"Unsupported chat snapshot version {version}")
+
+    reader = _Reader()
+    data: dict = {}
+    agents: list[dict] = []
+    while True:
+        head = file.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            break
+        kind, compression, length = _RECORD.unpack(head)
+        if kind not in _KNOWN_RECORDS:
+            file.seek(length, io.SEEK_CUR)  # written by a newer minor revision, not needed
+            continue
+        payload = json.loads(_decompress(file.read(length), compression))
+
+        if kind == RECORD_BLOB:
+            reader.blobs.append(payload)
+        elif kind == RECORD_CONTEXT:
+            data = payload
+        elif kind == RECORD_AGENT:
+            agents.append({**payload, "history": _empty_history()})
+        elif kind == RECORD_CURRENT:
+            agents[payload["agent"]]["history"]["current"] = reader.unpack_record(payload["current"])
+        elif kind == RECORD_PAST:
+            history = agents[payload["agent"]]["history"]
+            history["bulks"] = [reader.unpack_record(b) for b in payload["bulks"]]
+            history["topics"] = [reader.unpack_record(t) for t in payload["topics"]]
+        elif kind == RECORD_LOG:
+            data["log"] = {**payload, "logs": [reader.unpack_fields(item) for item in payload["logs"]]}
+
+    data["agents"] = agents
+    return data
+
+
+_KNOWN_RECORDS = {RECORD_CONTEXT, RECORD_AGENT, RECORD_BLOB, RECORD_CURRENT, RECORD_PAST, RECORD_LOG}
+
+
+class _Writer:
+    def __init__(self, out: BinaryIO, compression: int, default: Callable[[Any], Any] | None = None):
+        self.out = out
+        self.compression = compression
+        self.default = default
+        self.blobs: dict[bytes, int] = {}  # content digest to blob number
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=self.default).encode("utf-8", "surrogatepass")
+
+    def write(self, kind: int, payload: Any):
+        raw = self.dumps(payload)
+        compression = self.compression if len(raw) >= COMPRESS_MIN_SIZE else COMPRESSION_NONE
+        body = _compress(raw, compression)
+        self.out.write(_RECORD.pack(kind, compression, len(body)))
+        self.out.write(body)
+
+    def pack_record(self, record: dict | None) -> dict | None:
+        # history record with large contents moved to blobs, all nested records included
+        if record is None:
+            return None
+        packed = self.pack_fields(record)
+        if "messages" in record:
+            packed["messages"] = [self.pack_record(m) for m in record["messages"]]
+        if "records" in record:
+            packed["records"] = [self.pack_record(r) for r in record["records"]]
+        return packed
+
+    def pack_fields(self, item: dict) -> dict:
+        packed = dict(item)
+        for field in _BLOB_FIELDS:
+            value = item.get(field, None)
+            if not value:
+                continue
+            raw = self.dumps(value)
+            if len(raw) < BLOB_MIN_SIZE:
+                continue
+            del packed[field]
+            packed[field + _BLOB_SUFFIX] = self.get_blob(raw)
+        return packed
+
+    def get_blob(self, raw: bytes) -> int:
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        number = self.blobs.get(digest, None)
+        if number is None:
+            number = self.blobs[digest] = len(self.blobs)
+            compression = self.compression if len(raw) >= COMPRESS_MIN_SIZE else COMPRESSION_NONE
+            body = _compress(raw, compression)
+            self.out.write(_RECORD.pack(RECORD_BLOB, compression, len(body)))
+            self.out.write(body)
+        return number
+
+
+class _Reader:
+    def __init__(self):
+        self.blobs: list[Any] = []
+
+    def unpack_record(self, record: dict | None) -> dict | None:
+        if record is None:
+            return None
+        unpacked = self.unpack_fields(record)
+        if "messages" in record:
+            unpacked["messages"] = [self.unpack_record(m) for m in record["messages"]]
+        if "records" in record:
+            unpacked["records"] = [self.unpack_record(r) for r in record["records"]]
+        return unpacked
+
+    def unpack_fields(self, item: dict) -> dict:
+        unpacked = dict(item)
+        for field in _BLOB_FIELDS:
+            number = unpacked.pop(field + _BLOB_SUFFIX, None)
+            if number is not None:
+                unpacked[field] = self.blobs[number]
+        return unpacked
+
+
+def _empty_history() -> dict:
+    return {
+        "_cls": "History",
+        "bulks": [],
+        "topics": [],
+        "current": {"_cls": "Topic", "summary": "", "messages": []},
+    }
+
+
+def _compress(raw: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor().compress(raw)  # type: ignore
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(raw)
+    return raw
+
+
+def _decompress(body: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        if not zstandard:
+            raise ValueError("Chat snapshot compressed with zstd, install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(body)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    return body
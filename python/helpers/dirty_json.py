@@ -1,3 +1,54 @@
+import copy
+import re
+from typing import Any
+
+_START = re.compile(r"[{\[\"]")
+_VALUE_END = re.compile(r"[:,}\]]")
+_KEY_END = re.compile(r"[\s:,}\]]")
+_NON_SPACE = re.compile(r"\S")
+_QUOTES = ['"', "'", "`"]
+_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class _Slot:
+    """Place of a value that is still being parsed, holds its partial value in the live result."""
+
+    def __init__(self, container: dict | list | None, key: Any = None):
+        self.container = container  # None for the root value
+        self.key = key
+        self.attached = False
+        self.had = False
+        self.old = None
+
+    def attach(self, parser: "DirtyJson", value):
+        container = self.container
+        if container is None:
+            parser.result = value
+        elif isinstance(container, list):
+            if len(container) > self.key:
+                container[self.key] = value
+            else:
+                container.append(value)
+        else:
+            if not self.attached:
+                self.had = self.key in container
+                self.old = container.get(self.key)
+            container[self.key] = value
+        self.attached = True
+
+    def detach(self):
+        # undo the partial value, the parser then stores the final one the way parse() does
+        if not self.attached or self.container is None:
+            return
+        self.attached = False
+        if isinstance(self.container, list):
+            del self.container[self.key :]
+        elif self.had:
+            self.container[self.key] = self.old
+        else:
+            self.container.pop(self.key, None)
+
+
 class DirtyJson:
     def __init__(self):
         self._reset()
@@ -8,6 +59,17 @@ class DirtyJson:
         self.current_char = None
         self.result = None
         self.stack = []
+        # incremental (feed) state
+        self.done = False  # root value has been parsed
+        self.closed = False  # brackets of the root value are balanced, parse() may still read on after "}}"
+        self.start = -1  # absolute position of the root value
+        self.end = -1  # absolute position right after the root value's closing bracket
+        self._depth = 0
+        self._offset = 0  # absolute position of json_string[0]
+        self._final = False
+        self._stream = None
+        self._error: Exception | None = None
+        self._scalar: tuple[_Slot, str, list[str]] | None = None  # scalar being streamed
 
     @staticmethod
     def parse_string(json_string):
@@ -22,13 +84,370 @@ class DirtyJson:
         self._parse()
         return self.result
         
-    def feed(self, chunk):
-        self.json_string += chunk
-        if not self.current_char and self.json_string:
-            self.current_char = self.json_string[0]
-        self._parse()
+    def feed(self, chunk: str):
+        """Incrementally parse the next chunk of a streamed document.
+        Parsing resumes where the previous chunk ended and waits wherever parse() would look past the input received so far,
+        so the document ends up parsed exactly like parse_string() does. Consumed input is dropped.
+        The returned result is live, it keeps growing with further chunks and holds partial values of unfinished scalars.
+        Errors do not interrupt the stream, parsing stops and finish() raises them.
+        """
+        if not self.done and not self._error:
+            self.json_string += chunk
+            self._run()
+        return self.result
+
+    def finish(self):
+        """Treat the fed input as complete, resolve values still waiting for input and return the final result."""
+        self._final = True
+        if not self.done and not self._error:
+            self._run()
+        if self._error:
+            raise self._error
         return self.result
 
+    def copy_result(self, previous=None):
+        """Copy of the live result for keeping, shares the values that were complete in the previous copy of it."""
+        return _copy_tail(self.result, previous)
+
+    def _run(self):
+        if not self._stream:
+            self._stream = self._stream_root()
+        try:
+            next(self._stream)
+        except StopIteration:
+            pass
+        except Exception as e:
+            self._error = e
+            return
+        if self.start >= 0:
+            # drop consumed input, the parser may have skipped past the end already
+            cut = min(self.index, len(self.json_string))
+            self._offset += cut
+            self.json_string = self.json_string[cut:]
+            self.index -= cut
+        self._update_partial()
+
+    def _update_partial(self):
+        # expose the scalar that is being streamed right now
+        if not self._scalar or self.done:
+            return
+        slot, kind, parts = self._scalar
+        text = "".join(parts)
+        parts[:] = [text]  # collapse so repeated reads stay linear
+        value: Any = text
+        if kind in ["multiline", "unquoted"]:
+            value = text.strip()
+        elif kind == "number":
+            try:
+                value = int(text)
+            except ValueError:
+                try:
+                    value = float(text)
+                except ValueError:
+                    return
+        slot.attach(self, value)
+
+    # the _stream_ generators follow the _parse_ methods step by step, they yield while
+    # the characters they need to look at have not arrived yet and the input is not final
+
+    def _char(self) -> str | None:
+        return self.json_string[self.index] if self.index < len(self.json_string) else None
+
+    def _wait(self, count: int = 1):
+        while self.index + count > len(self.json_string) and not self._final:
+            yield
+
+    def _stream_root(self):
+        searched = 0
+        while True:
+            match = _START.search(self.json_string, searched)
+            if match or self._final:
+                break
+            searched = len(self.json_string)
+            yield
+        self.index = match.start() if match else 0
+        self.start = self._offset + self.index
+        self.current_char = self.json_string[self.index]  # empty input fails like parse()
+        self.result = yield from self._stream_value(_Slot(None))
+        self.done = True
+        if not self.closed:
+            self.closed = True
+            self.end = self._offset + self.index
+
+    def _stream_skip_whitespace(self):
+        while True:
+            yield from self._wait()
+            char = self._char()
+            if char is None:
+                return
+            if char.isspace():
+                match = _NON_SPACE.search(self.json_string, self.index)
+                self.index = match.start() if match else len(self.json_string)
+                continue
+            if char != "/":
+                return
+            yield from self._wait(2)
+            if self._peek(1) == "/":  # Single-line comment
+                while True:
+                    end = self.json_string.find("\n", self.index)
+                    if end != -1:
+                        self.index = end + 1
+                        break
+                    self.index = len(self.json_string)
+                    if self._final:
+                        break
+                    yield
+            elif self._peek(1) == "*":  # Multi-line comment
+                self.index += 2
+                while True:
+                    end = self.json_string.find("*/", self.index)
+                    if end != -1:
+                        self.index = end + 2
+                        break
+                    if self._final:
+                        self.index = max(self.index, len(self.json_string))
+                        break
+                    self.index = max(self.index, len(self.json_string) - 1)
+                    yield
+            else:
+                return
+
+    def _stream_value(self, slot: _Slot):
+        yield from self._stream_skip_whitespace()
+        char = self._char()
+        if char == "{":
+            yield from self._wait(2)
+            if self._peek(1) == "{":  # Handle {{
+                self.index += 2
+                self._depth += 1
+            return (yield from self._stream_object(slot))
+        elif char == "[":
+            return (yield from self._stream_array(slot))
+        elif char in _QUOTES:
+            yield from self._wait(3)
+            if self._peek(2) == char * 2:  # type: ignore
+                return (yield from self._stream_multiline_string(slot))
+            return (yield from self._stream_string(slot))
+        elif char and (char.isdigit() or char in ["-", "+"]):
+            return (yield from self._stream_number(slot))
+        elif (yield from self._stream_match("true")):
+            return True
+        elif (yield from self._stream_match("false")):
+            return False
+        elif (yield from self._stream_match("null")) or (
+            yield from self._stream_match("undefined")
+        ):
+            return None
+        elif char:
+            return (yield from self._stream_unquoted_string(slot))
+        return None
+
+    def _stream_match(self, text: str):
+        yield from self._wait(len(text) + 1)
+        return self._match(text)
+
+    def _stream_object(self, slot: _Slot):
+        obj = {}
+        self.index += 1  # Skip opening brace
+        self._depth += 1
+        self.stack.append(obj)
+        slot.attach(self, obj)
+        yield from self._stream_object_content(obj)
+        return obj
+
+    def _stream_object_content(self, obj: dict):
+        while True:
+            yield from self._wait()
+            if self._char() is None:
+                return
+            yield from self._stream_skip_whitespace()
+            char = self._char()
+            if char == "}":
+                yield from self._wait(2)
+                self._close(2 if self._peek(1) == "}" else 1)  # Handle }}
+                self.stack.pop()
+                return
+            if char is None:
+                self.stack.pop()
+                return
+
+            key = yield from self._stream_key()
+            value = None
+            yield from self._stream_skip_whitespace()
+            slot = _Slot(obj, key)
+            char = self._char()
+            if char == ":":
+                self.index += 1
+                value = yield from self._stream_value(slot)
+            elif char is not None:
+                value = yield from self._stream_value(slot)
+            slot.detach()
+
+            self.stack[-1][key] = value
+
+            yield from self._stream_skip_whitespace()
+            char = self._char()
+            if char == ",":
+                self.index += 1
+            elif char is None:
+                self.stack.pop()
+                return
+
+    def _close(self, count: int):
+        self.index += count
+        self._depth -= count
+        if self._depth <= 0 and not self.closed:
+            self.closed = True
+            self.end = self._offset + self.index
+
+    def _stream_key(self):
+        yield from self._stream_skip_whitespace()
+        if self._char() in ['"', "'"]:
+            return (yield from self._stream_string(None))
+        parts = []
+        yield from self._stream_until(_KEY_END, parts)
+        return "".join(parts)
+
+    def _stream_array(self, slot: _Slot):
+        arr = []
+        self.index += 1  # Skip opening bracket
+        self._depth += 1
+        self.stack.append(arr)
+        slot.attach(self, arr)
+        yield from self._stream_array_content(arr)
+        return arr
+
+    def _stream_array_content(self, arr: list):
+        while True:
+            yield from self._wait()
+            if self._char() is None:
+                return
+            yield from self._stream_skip_whitespace()
+            if self._char() == "]":
+                self._close(1)
+                self.stack.pop()
+                return
+            slot = _Slot(arr, len(arr))
+            value = yield from self._stream_value(slot)
+            slot.detach()
+            self.stack[-1].append(value)
+            yield from self._stream_skip_whitespace()
+            char = self._char()
+            if char == ",":
+                self.index += 1
+            elif char != "]":
+                self.stack.pop()
+                return
+
+    def _stream_string(self, slot: _Slot | None):
+        parts = []
+        quote_char = self._char()
+        self.index += 1  # Skip opening quote
+        if slot:
+            self._scalar = (slot, "string", parts)
+        while True:
+            yield from self._wait()
+            char = self._char()
+            if char is None or char == quote_char:
+                break
+            if char == "\\":
+                self.index += 1
+                yield from self._wait()
+                char = self._char()
+                if char in ['"', "'", "\\", "/", "b", "f", "n", "r", "t"]:
+                    parts.append(_ESCAPES.get(char, char))  # type: ignore
+                elif char == "u":
+                    self.index += 1  # Skip 'u'
+                    unicode_char = ""
+                    for _ in range(4):
+                        yield from self._wait()
+                        char = self._char()
+                        if char is None or not char.isalnum():
+                            self._scalar = None
+                            return "".join(parts) + "\\u" + unicode_char
+                        unicode_char += char
+                        self.index += 1
+                    try:
+                        parts.append(chr(int(unicode_char, 16)))
+                    except ValueError:
+                        parts.append("\\u" + unicode_char)
+                    continue
+                self.index += 1
+                continue
+            # plain text up to the next quote or backslash
+            text = self.json_string
+            quote = text.find(quote_char, self.index)  # type: ignore
+            end = quote if quote != -1 else len(text)
+            escape = text.find("\\", self.index, end)
+            end = escape if escape != -1 else end
+            parts.append(text[self.index : end])
+            self.index = end
+        if char == quote_char:
+            self.index += 1  # Skip closing quote
+        self._scalar = None
+        return "".join(parts)
+
+    def _stream_multiline_string(self, slot: _Slot):
+        parts = []
+        quote = self._char() * 3  # type: ignore
+        self.index += 3  # Skip opening quotes
+        self._scalar = (slot, "multiline", parts)
+        while True:
+            text = self.json_string
+            end = text.find(quote, self.index)
+            if end != -1:
+                parts.append(text[self.index : end])
+                self.index = end + 3  # Skip closing quotes
+                break
+            if self._final:
+                parts.append(text[self.index :])
+                self.index = max(self.index, len(text))
+                break
+            safe = max(self.index, len(text) - 2)  # the end may hold the start of the closing quotes
+            parts.append(text[self.index : safe])
+            self.index = safe
+            yield
+        self._scalar = None
+        return "".join(parts).strip()
+
+    def _stream_number(self, slot: _Slot):
+        parts = []
+        self._scalar = (slot, "number", parts)
+        while True:
+            yield from self._wait()
+            char = self._char()
+            if char is None or not (char.isdigit() or char in ["-", "+", ".", "e", "E"]):
+                break
+            parts.append(char)
+            self.index += 1
+        self._scalar = None
+        number_str = "".join(parts)
+        try:
+            return int(number_str)
+        except ValueError:
+            return float(number_str)
+
+    def _stream_unquoted_string(self, slot: _Slot):
+        parts = []
+        self._scalar = (slot, "unquoted", parts)
+        yield from self._stream_until(_VALUE_END, parts)
+        self._scalar = None
+        self.index += 1
+        return "".join(parts).strip()
+
+    def _stream_until(self, pattern: re.Pattern, parts: list[str]):
+        # collect text up to the next match of the pattern
+        while True:
+            text = self.json_string
+            match = pattern.search(text, self.index)
+            end = match.start() if match else len(text)
+            if end > self.index:
+                parts.append(text[self.index : end])
+                self.index = end
+            if match or self._final:
+                return
+            yield
+
     def _advance(self, count=1):
         self.index += count
         if self.index < len(self.json_string):
@@ -292,3 +711,23 @@ class DirtyJson:
         chars = ["{", "[", '"']
         indices = [input_str.find(char) for char in chars if input_str.find(char) != -1]
         return min(indices) if indices else 0
+
+
+def _copy_tail(value, previous):
+    # the parser only changes the last item of its containers, earlier ones are complete and shared
+    if isinstance(value, dict) and isinstance(previous, dict):
+        keys = list(value)
+        shared = max(len(previous) - 1, 0)
+        if keys[:shared] == list(previous)[:shared]:
+            result = {key: previous[key] for key in keys[:shared]}
+            for key in keys[shared:]:
+                result[key] = _copy_tail(value[key], previous.get(key, None))
+            return result
+    elif isinstance(value, list) and isinstance(previous, list):
+        shared = max(len(previous) - 1, 0)
+        if len(value) >= shared:
+            return previous[:shared] + [
+                _copy_tail(item, previous[i] if i < len(previous) else None)
+                for i, item in enumerate(value[shared:], shared)
+            ]
+    return copy.deepcopy(value)
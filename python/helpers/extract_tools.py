@@ -1,4 +1,5 @@
-import re, os, importlib, inspect
+import re, os, sys, importlib, inspect, threading, time
+from dataclasses import dataclass, field
 from typing import Any, Type, TypeVar
 from .dirty_json import DirtyJson
 from .files import get_abs_path
@@ -12,6 +13,29 @@ def json_parse_dirty(json:str) -> dict[str,Any] | None:
         if isinstance(data,dict): return data
     return None
 
+def json_parse_dirty_list(json:str) -> list[dict[str,Any]] | None:
+    # single object or an array of objects, whichever starts first
+    obj_start = json.find('{')
+    arr_start = json.find('[')
+    if arr_start != -1 and (obj_start == -1 or arr_start < obj_start):
+        ext_json = extract_json_array_string(json)
+        if ext_json:
+            data = DirtyJson.parse_string(ext_json)
+            if isinstance(data,list):
+                objects = [d for d in data if isinstance(d,dict)]
+                if objects: return objects
+    data = json_parse_dirty(json)
+    return [data] if data is not None else None
+
+def extract_json_array_string(content):
+    start = content.find('[')
+    if start == -1:
+        return ""
+    end = content.rfind(']')
+    if end == -1:
+        return content[start:]
+    return content[start:end+1]
+
 def extract_json_object_string(content):
     start = content.find('{')
     if start == -1:
@@ -77,4 +101,85 @@ def load_classes_from_folder(folder: str, name_pattern: str, base_class: Type[T]
                 if one_per_file:
                     break
 
-    return classes
\ No newline at end of file
+    return classes
+
+
+# seconds between mtime checks of an already scanned folder
+CLASSES_CACHE_CHECK_INTERVAL = 1.0
+
+
+@dataclass
+class _FolderClasses:
+    mtimes: dict[str, float]
+    checked: float
+    classes: dict[tuple[str, type, bool], list[type]] = field(default_factory=dict)
+
+
+_classes_cache: dict[str, _FolderClasses] = {}
+_classes_lock = threading.RLock()
+
+
+def get_cached_classes(folder: str, name_pattern: str, base_class: Type[T], one_per_file: bool = True) -> list[Type[T]]:
+    """Cached variant of load_classes_from_folder for the agent loop.
+    The folder is scanned once, later calls only compare file mtimes (at most once per CLASSES_CACHE_CHECK_INTERVAL)
+    and changed modules are reloaded before the classes are resolved again."""
+    with _classes_lock:
+        entry = _get_folder_entry(folder)
+
+        # exact file name that does not exist, do not cache arbitrary names (e.g. unknown tools)
+        if not _is_pattern(name_pattern) and name_pattern not in entry.mtimes:
+            return []
+
+        key = (name_pattern, base_class, one_per_file)
+        if key not in entry.classes:
+            entry.classes[key] = load_classes_from_folder(folder, name_pattern, base_class, one_per_file)
+        return entry.classes[key]  # type: ignore
+
+
+def reload_cached_classes(folder: str | None = None):
+    """Drop cached classes of one folder (or all) and reload their already imported modules."""
+    with _classes_lock:
+        folders = [folder] if folder else list(_classes_cache.keys())
+        for fold in folders:
+            entry = _classes_cache.pop(fold, None)
+            if entry:
+                _reload_modules(fold, list(entry.mtimes.keys()))
+
+
+def _get_folder_entry(folder: str) -> _FolderClasses:
+    now = time.time()
+    entry = _classes_cache.get(folder)
+    if entry and now - entry.checked < CLASSES_CACHE_CHECK_INTERVAL:
+        return entry
+
+    mtimes = _get_folder_mtimes(folder)
+    if entry and mtimes == entry.mtimes:
+        entry.checked = now
+        return entry
+
+    if entry:
+        # reload modules that were changed, new files will be imported fresh
+        changed = [f for f, t in mtimes.items() if entry.mtimes.get(f, t) != t]
+        _reload_modules(folder, changed)
+
+    entry = _FolderClasses(mtimes=mtimes, checked=now)
+    _classes_cache[folder] = entry
+    return entry
+
+
+def _get_folder_mtimes(folder: str) -> dict[str, float]:
+    abs_folder = get_abs_path(folder)
+    with os.scandir(abs_folder) as it:
+        return {e.name: e.stat().st_mtime for e in it if e.name.endswith(".py") and e.is_file()}
+
+
+def _reload_modules(folder: str, file_names: list[str]):
+    for file_name in file_names:
+        module_path = folder.replace("/", ".") + "." + file_name[:-3]
+        module = sys.modules.get(module_path)
+        if module:
+            importlib.reload(module)
+
+
+def _is_pattern(name_pattern: str) -> bool:
+    return any(c in name_pattern for c in "*?[")
@@ -0,0 +1,125 @@
+import re
+
+import numpy as np
+
+SUMMARY_RATIO = 0.2  # target share of the original length
+MIN_SENTENCE_WORDS = 3
+MAX_KEY_VALUES = 20
+MAX_VALUE_LENGTH = 80  # longer values are content, not facts to keep verbatim
+TRUNCATION_MARK = "..."
+POSITION_BONUS = 0.1  # opening and closing sentences of a text tend to carry the task and the outcome
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+# key: value / key=value / "key": "value", unquoted values must end the field so prose like "Error: file not found" is skipped
+_KEY_VALUE = re.compile(
+    r'"?([A-Za-z_][\w.\-]{0,40})"?\s*[:=]\s*'
+    r'("[^"\n]{1,%d}"(?=\s*[,;}\]\n]|$)|[^\s,;{}\[\]"]{1,%d}(?=[,;}\]"\n]|$))'
+    % (MAX_VALUE_LENGTH, MAX_VALUE_LENGTH),
+    re.MULTILINE,
+)
+
+
+def summarize(text: str, ratio: float = SUMMARY_RATIO) -> str:
+    """Extractive summary without any model call.
+    Sentences are ranked by TF-IDF centrality and kept in their original order up to the target length,
+    short key-value facts (ids, paths, statuses, numbers from tool results) are preserved verbatim."""
+    sentences = split_sentences(text)
+    if not sentences:
+        return text.strip()
+
+    budget = max(len(text) * ratio, 1)
+    scores = score_sentences(sentences)
+    chosen: dict[int, str] = {}
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        sentence = sentences[i]
+        if used + len(sentence) > budget:
+            if chosen:
+                continue
+            sentence = truncate_sentence(sentence, budget)  # the best sentence alone is over the budget
+        chosen[int(i)] = sentence
+        used += len(sentence)
+    summary = " ".join(chosen[i] for i in sorted(chosen))
+
+    facts = [f"{k}: {v}" for k, v, raw in extract_key_values(text) if raw not in summary]
+    if facts:
+        summary += "\n" + "; ".join(facts)
+    return summary
+
+
+def split_sentences(text: str) -> list[str]:
+    result: list[str] = []
+    seen: set[str] = set()
+    for sentence in _SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if len(_WORD.findall(sentence)) < MIN_SENTENCE_WORDS or sentence in seen:
+            continue
+        seen.add(sentence)
+        result.append(sentence)
+    return result
+
+
+def truncate_sentence(sentence: str, length: float) -> str:
+    # cut to the length, the mark included, at a word boundary when the cut falls into a word
+    room = int(length) - len(TRUNCATION_MARK)
+    if room <= 0:
+        return sentence[: max(int(length), 1)]
+    head = sentence[:room]
+    if not sentence[room].isspace() and " " in head:
+        head = head.rsplit(" ", 1)[0]
+    return head.rstrip() + TRUNCATION_MARK
+
+
+def score_sentences(sentences: list[str]) -> np.ndarray:
+    """Degree centrality of each sentence in the TF-IDF cosine similarity graph.
+    Row sums of the similarity matrix equal X @ X.sum(0), so the N x N matrix is never built."""
+    vocab: dict[str, int] = {}
+    sent_ids: list[int] = []
+    term_ids: list[int] = []
+    for i, sentence in enumerate(sentences):
+        for word in _WORD.findall(sentence.lower()):
+            sent_ids.append(i)
+            term_ids.append(vocab.setdefault(word, len(vocab)))
+
+    n, v = len(sentences), max(len(vocab), 1)
+    if not term_ids:
+        return np.zeros(n)
+
+    # sparse sentence x term counts as (sentence, term, count) triplets
+    pairs, counts = np.unique(
+        np.array(sent_ids, dtype=np.int64) * v + np.array(term_ids, dtype=np.int64),
+        return_counts=True,
+    )
+    sent, term = pairs // v, pairs % v
+    lengths = np.bincount(sent, weights=counts, minlength=n)
+    df = np.bincount(term, minlength=v)
+    idf = np.log((1 + n) / (1 + df)) + 1
+
+    weights = counts / lengths[sent] * idf[term]
+    norms = np.sqrt(np.bincount(sent, weights=weights**2, minlength=n))
+    weights = weights / norms[sent]
+
+    column = np.bincount(term, weights=weights, minlength=v)
+    centrality = np.bincount(sent, weights=weights * column[term], minlength=n) - 1
+    centrality = centrality / max(centrality.max(), 1e-9)
+
+    if n > 2:
+        centrality[0] += POSITION_BONUS
+        centrality[-1] += POSITION_BONUS
+    return centrality
+
+
+def extract_key_values(text: str) -> list[tuple[str, str, str]]:
+    # (key, value, matched text)
+    result: list[tuple[str, str, str]] = []
+    seen: set[tuple[str, str]] = set()
+    for match in _KEY_VALUE.finditer(text):
+        key, value = match.group(1), match.group(2).strip('"')
+        if not value or (key, value) in seen:
+            continue
+        seen.add((key, value))
+        result.append((key, value, match.group(0)))
+        if len(result) >= MAX_KEY_VALUES:
+            break
+    return result
@@ -1,10 +1,13 @@
 from abc import abstractmethod
 import asyncio
 from collections import OrderedDict
+from dataclasses import asdict, dataclass
 import json
 import math
+import threading
 from typing import Coroutine, Literal, TypedDict, cast
-from python.helpers import messages, tokens, settings, call_llm
+import models
+from python.helpers import messages, tokens, settings, call_llm, summary_cache, extractive_summary
 from enum import Enum
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 
@@ -15,6 +18,22 @@ HISTORY_TOPIC_RATIO = 0.3
 HISTORY_BULK_RATIO = 0.2
 TOPIC_COMPRESS_RATIO = 0.65
 LARGE_MESSAGE_TO_TOPIC_RATIO = 0.25
+SUMMARY_TO_TOPIC_RATIO = 0.2  # expected size of a topic summary, used to plan how many topics to summarize
+COMPRESS_CONCURRENCY = 4  # summaries running at once, each still waits for the utility model rate limiter
+LOCAL_SUMMARY_OVERRUN = 0.1  # overruns up to this share of the part budget are summarized locally
+
+
+@dataclass
+class CompressionMetrics:
+    background_runs: int = 0
+    background_seconds: float = 0.0
+    stalls: int = 0  # turns that had to wait for compression
+    stall_seconds: float = 0.0
+    stall_max: float = 0.0
+
+
+_metrics = CompressionMetrics()
+_metrics_lock = threading.Lock()
 
 MessageContent = (
     list["MessageContent"]
@@ -32,12 +51,41 @@ class OutputMessage(TypedDict):
 
 class Record:
     def __init__(self):
-        pass
+        self.parent: Record | None = None  # containing topic, bulk or history
+        self._tokens: int | None = None  # cached token count
+        self._output: list[OutputMessage] | None = None  # cached output, do not modify
+        self._dict: dict | None = None  # cached to_dict, do not modify, saves hand it to the chat writer
+        self._summary: MessageContent = ""
+
+    @property
+    def summary(self) -> MessageContent:
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: MessageContent):
+        self._summary = value
+        self.invalidate()
 
     def get_tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = self.calculate_tokens()
+        return self._tokens
+
+    def calculate_tokens(self) -> int:
         out = self.output_text()
         return tokens.approximate_tokens(out)
 
+    def invalidate(self):
+        # content changed, drop cached token counts and outputs of this record and all records containing it
+        self._tokens = None
+        self._output = None
+        self._dict = None
+        if self.parent:
+            self.parent.child_changed(self)
+
+    def child_changed(self, child: "Record"):
+        self.invalidate()
+
     @abstractmethod
     async def compress(self) -> bool:
         pass
@@ -50,8 +98,14 @@ class Record:
     async def summarize(self) -> str:
         pass
 
-    @abstractmethod
     def to_dict(self) -> dict:
+        # serialized once until the record changes, unchanged records of a saved chat are not copied again
+        if self._dict is None:
+            self._dict = self._to_dict()
+        return self._dict
+
+    @abstractmethod
+    def _to_dict(self) -> dict:
         pass
 
     @staticmethod
@@ -68,9 +122,18 @@ class Record:
 
 class Message(Record):
     def __init__(self, ai: bool, content: MessageContent):
+        super().__init__()
         self.ai = ai
-        self.content = content
-        self.summary: MessageContent = ""
+        self._content = content
+
+    @property
+    def content(self) -> MessageContent:
+        return self._content
+
+    @content.setter
+    def content(self, value: MessageContent):
+        self._content = value
+        self.invalidate()
 
     async def compress(self):
         return False
@@ -84,7 +147,7 @@ class Message(Record):
     def output_text(self, human_label="user", ai_label="ai"):
         return output_text(self.output(), ai_label, human_label)
 
-    def to_dict(self):
+    def _to_dict(self):
         return {
             "_cls": "Message",
             "ai": self.ai,
@@ -101,24 +164,46 @@ class Message(Record):
 
 class Topic(Record):
     def __init__(self, history: "History"):
+        super().__init__()
         self.history = history
-        self.summary: str = ""
+        self.parent = history
         self.messages: list[Message] = []
 
     def add_message(self, ai: bool, content: MessageContent):
         msg = Message(ai=ai, content=content)
+        msg.parent = self
         self.messages.append(msg)
+        self.invalidate(appended=True)
         return msg
 
-    def output(self) -> list[OutputMessage]:
+    def invalidate(self, appended: bool = False):
+        # anything but an appended message rewrites recorded history
+        if not appended:
+            self.history.revision += 1
+        super().invalidate()
+
+    def calculate_tokens(self) -> int:
         if self.summary:
-            return [OutputMessage(ai=False, content=self.summary)]
-        else:
-            msgs = [m for r in self.messages for m in r.output()]
-            return group_outputs_abab(msgs)
+            return super().calculate_tokens()
+        # count all messages not counted yet in one batch
+        uncounted = [m for m in self.messages if m._tokens is None]
+        if len(uncounted) > 1:
+            counts = tokens.approximate_tokens_batch([m.output_text() for m in uncounted])
+            for msg, count in zip(uncounted, counts):
+                msg._tokens = count
+        return sum(m.get_tokens() for m in self.messages)
 
-    async def summarize(self):
-        self.summary = await self.summarize_messages(self.messages)
+    def output(self) -> list[OutputMessage]:
+        if self._output is None:
+            if self.summary:
+                self._output = [OutputMessage(ai=False, content=self.summary)]
+            else:
+                msgs = [m for r in self.messages for m in r.output()]
+                self._output = group_outputs_abab(msgs)
+        return self._output
+
+    async def summarize(self, local: bool = False):
+        self.summary = await self.summarize_messages(self.messages, local)
         return self.summary
 
     async def compress_large_messages(self) -> bool:
@@ -131,11 +216,10 @@ class Topic(Record):
         )
         large_msgs = []
         for m in (m for m in self.messages if not m.summary):
-            out = m.output()
-            text = output_text(out)
-            tok = tokens.approximate_tokens(text)
-            leng = len(text)
+            tok = m.get_tokens()
             if tok > msg_max_size:
+                out = m.output()
+                leng = len(output_text(out))
                 large_msgs.append((m, tok, leng, out))
         large_msgs.sort(key=lambda x: x[1], reverse=True)
         for msg, tok, leng, out in large_msgs:
@@ -148,40 +232,36 @@ class Topic(Record):
             )
             msg.summary = trunc
 
-            return True
-        return False
+        # all large messages are truncated in one pass, no model calls needed
+        return bool(large_msgs)
 
-    async def compress(self) -> bool:
+    async def compress(self, local: bool = False) -> bool:
         compress = await self.compress_large_messages()
         if not compress:
-            compress = await self.compress_attention()
+            compress = await self.compress_attention(local)
         return compress
 
-    async def compress_attention(self) -> bool:
+    async def compress_attention(self, local: bool = False) -> bool:
 
         if len(self.messages) > 2:
             cnt_to_sum = math.ceil((len(self.messages) - 2) * TOPIC_COMPRESS_RATIO)
             msg_to_sum = self.messages[1 : cnt_to_sum + 1]
-            summary = await self.summarize_messages(msg_to_sum)
+            summary = await self.summarize_messages(msg_to_sum, local)
             sum_msg_content = self.history.agent.parse_prompt(
                 "fw.msg_summary.md", summary=summary
             )
             sum_msg = Message(False, sum_msg_content)
+            sum_msg.parent = self
             self.messages[1 : cnt_to_sum + 1] = [sum_msg]
+            self.invalidate()
             return True
         return False
 
-    async def summarize_messages(self, messages: list[Message]):
+    async def summarize_messages(self, messages: list[Message], local: bool = False):
         msg_txt = [m.output_text() for m in messages]
-        summary = await self.history.agent.call_utility_model(
-            system=self.history.agent.read_prompt("fw.topic_summary.sys.md"),
-            message=self.history.agent.read_prompt(
-                "fw.topic_summary.msg.md", content=msg_txt
-            ),
-        )
-        return summary
+        return await summarize_content(self.history.agent, msg_txt, local)
 
-    def to_dict(self):
+    def _to_dict(self):
         return {
             "_cls": "Topic",
             "summary": self.summary,
@@ -195,37 +275,47 @@ class Topic(Record):
         topic.messages = [
             Message.from_dict(m, history=history) for m in data["messages"]
         ]
+        for msg in topic.messages:
+            msg.parent = topic
         return topic
 
 
 class Bulk(Record):
     def __init__(self, history: "History"):
+        super().__init__()
         self.history = history
-        self.summary: str = ""
+        self.parent = history
         self.records: list[Record] = []
 
+    def add_record(self, record: Record):
+        record.parent = self
+        self.records.append(record)
+        self.invalidate()
+
+    def calculate_tokens(self) -> int:
+        if self.summary:
+            return super().calculate_tokens()
+        return sum(r.get_tokens() for r in self.records)
+
     def output(
         self, human_label: str = "user", ai_label: str = "ai"
     ) -> list[OutputMessage]:
-        if self.summary:
-            return [OutputMessage(ai=False, content=self.summary)]
-        else:
-            msgs = [m for r in self.records for m in r.output()]
-            return group_outputs_abab(msgs)
+        if self._output is None:
+            if self.summary:
+                self._output = [OutputMessage(ai=False, content=self.summary)]
+            else:
+                msgs = [m for r in self.records for m in r.output()]
+                self._output = group_outputs_abab(msgs)
+        return self._output
 
     async def compress(self):
         return False
 
-    async def summarize(self):
-        self.summary = await self.history.agent.call_utility_model(
-            system=self.history.agent.read_prompt("fw.topic_summary.sys.md"),
-            message=self.history.agent.read_prompt(
-                "fw.topic_summary.msg.md", content=self.output_text()
-            ),
-        )
+    async def summarize(self, local: bool = False):
+        self.summary = await summarize_content(self.history.agent, self.output_text(), local)
         return self.summary
 
-    def to_dict(self):
+    def _to_dict(self):
         return {
             "_cls": "Bulk",
             "summary": self.summary,
@@ -238,6 +328,8 @@ class Bulk(Record):
         bulk.summary = data["summary"]
         cls = data["_cls"]
         bulk.records = [Record.from_dict(r, history=history) for r in data["records"]]
+        for record in bulk.records:
+            record.parent = bulk
         return bulk
 
 
@@ -245,21 +337,36 @@ class History(Record):
     def __init__(self, agent):
         from agent import Agent
 
+        super().__init__()
         self.bulks: list[Bulk] = []
         self.topics: list[Topic] = []
         self.current = Topic(history=self)
         self.agent: Agent = agent
+        # running totals of past bulks and topics, None when they need to be summed again
+        self._bulks_tokens: int | None = None
+        self._topics_tokens: int | None = None
+        self._past_output: list[OutputMessage] | None = None  # grouped output of bulks and topics
+        # bumped on every change except messages appended to the current topic and new topics,
+        # the chat journal records those as they come and stores the whole history otherwise
+        self.revision = 0
 
     def is_over_limit(self):
         limit = get_ctx_size_for_history()
         total = self.get_tokens()
         return total > limit
 
+    def is_over_watermark(self):
+        return self.get_tokens() > get_ctx_watermark_for_history()
+
     def get_bulks_tokens(self) -> int:
-        return sum(record.get_tokens() for record in self.bulks)
+        if self._bulks_tokens is None:
+            self._bulks_tokens = sum(record.get_tokens() for record in self.bulks)
+        return self._bulks_tokens
 
     def get_topics_tokens(self) -> int:
-        return sum(record.get_tokens() for record in self.topics)
+        if self._topics_tokens is None:
+            self._topics_tokens = sum(record.get_tokens() for record in self.topics)
+        return self._topics_tokens
 
     def get_current_topic_tokens(self) -> int:
         return self.current.get_tokens()
@@ -271,6 +378,23 @@ class History(Record):
             + self.get_current_topic_tokens()
         )
 
+    def child_changed(self, child: Record):
+        # only the part containing the changed record is summed again
+        if child is self.current:
+            return
+        self.revision += 1
+        if isinstance(child, Bulk):
+            self._bulks_tokens = None
+        else:
+            self._topics_tokens = None
+        self._past_output = None
+
+    def invalidate(self):
+        self.revision += 1
+        self._bulks_tokens = None
+        self._topics_tokens = None
+        self._past_output = None
+
     def add_message(self, ai: bool, content: MessageContent):
         return self.current.add_message(ai, content=content)
 
@@ -278,23 +402,27 @@ class History(Record):
         if self.current.messages:
             self.topics.append(self.current)
             self.current = Topic(history=self)
+            self._topics_tokens = None
+            self._past_output = None
 
     def output(self) -> list[OutputMessage]:
-        result: list[OutputMessage] = []
-        result += [m for b in self.bulks for m in b.output()]
-        result += [m for t in self.topics for m in t.output()]
-        result += self.current.output()
-        result = group_outputs_abab(result)
-        return result
+        # past bulks and topics are rendered once until they change, only the current topic is added each time
+        if self._past_output is None:
+            past = [m for b in self.bulks for m in b.output()]
+            past += [m for t in self.topics for m in t.output()]
+            self._past_output = group_outputs_abab(past)
+        return join_outputs(self._past_output, self.current.output())
 
     @staticmethod
     def from_dict(data: dict, history: "History"):
         history.bulks = [Bulk.from_dict(b, history=history) for b in data["bulks"]]
         history.topics = [Topic.from_dict(t, history=history) for t in data["topics"]]
         history.current = Topic.from_dict(data["current"], history=history)
+        history.invalidate()
         return history
 
     def to_dict(self):
+        # the lists change with every new topic, their records are cached
         return {
             "_cls": "History",
             "bulks": [b.to_dict() for b in self.bulks],
@@ -306,7 +434,8 @@ class History(Record):
         data = self.to_dict()
         return json.dumps(data)
 
-    async def compress(self):
+    async def compress(self, limit: int = 0):
+        # compress until all parts fit their ratios of the limit, the whole history space by default
         compressed = False
         while True:
             curr, hist, bulk = (
@@ -314,82 +443,154 @@ class History(Record):
                 self.get_topics_tokens(),
                 self.get_bulks_tokens(),
             )
-            total = get_ctx_size_for_history()
-            ratios = [
-                (curr, CURRENT_TOPIC_RATIO, "current_topic"),
-                (hist, HISTORY_TOPIC_RATIO, "history_topic"),
-                (bulk, HISTORY_BULK_RATIO, "history_bulk"),
-            ]
-            ratios = sorted(ratios, key=lambda x: (x[0] / total) / x[1], reverse=True)
-            compressed_part = False
-            for ratio in ratios:
-                if ratio[0] > ratio[1] * total:
-                    over_part = ratio[2]
-                    if over_part == "current_topic":
-                        compressed_part = await self.current.compress()
-                    elif over_part == "history_topic":
-                        compressed_part = await self.compress_topics()
-                    else:
-                        compressed_part = await self.compress_bulks()
-                    if compressed_part:
-                        break
-
-            if compressed_part:
+            total = limit or get_ctx_size_for_history()
+            over_curr = curr > CURRENT_TOPIC_RATIO * total
+            over_hist = hist > HISTORY_TOPIC_RATIO * total
+            over_bulk = bulk > HISTORY_BULK_RATIO * total
+            if not (over_curr or over_hist or over_bulk):
+                return compressed
+
+            async def compress_current():
+                if not over_curr:
+                    return False
+                local = self.use_local_summary(curr, CURRENT_TOPIC_RATIO * total)
+                return await self.current.compress(local)
+
+            async def compress_history():
+                # topics can move to bulks, so bulks are compressed after them
+                done = False
+                if over_hist:
+                    local = self.use_local_summary(hist, HISTORY_TOPIC_RATIO * total)
+                    done = await self.compress_topics(hist - HISTORY_TOPIC_RATIO * total, local)
+                if over_bulk:
+                    local = self.use_local_summary(bulk, HISTORY_BULK_RATIO * total)
+                    done = await self.compress_bulks(local) or done
+                return done
+
+            # the current topic and past history do not share records, compress them at the same time
+            results = await asyncio.gather(compress_current(), compress_history())
+            if any(results):
                 compressed = True
                 continue
             else:
                 return compressed
 
-    async def compress_topics(self) -> bool:
-        # summarize topics one by one
+    def use_local_summary(self, tokens: float, budget: float) -> bool:
+        # small overruns are handled by the extractive summarizer, no model call
+        return tokens - budget <= budget * LOCAL_SUMMARY_OVERRUN
+
+    async def compress_topics(self, excess: float = 0, local: bool = False) -> bool:
+        # plan the oldest topics whose summaries are expected to get rid of the excess and summarize them all at once
+        planned: list[Topic] = []
+        saved = 0.0
         for topic in self.topics:
             if not topic.summary:
-                await topic.summarize()
-                return True
+                planned.append(topic)
+                saved += topic.get_tokens() * (1 - SUMMARY_TO_TOPIC_RATIO)
+                if saved >= excess:
+                    break
+        if planned:
+            await gather_limited([topic.summarize(local) for topic in planned])
+            return True
 
-        # move oldest topic to bulks and summarize
+        # all topics are summarized, move the oldest ones to bulks until they make up for the excess,
+        # the next round moves more if needed and bulks over their ratio are merged in between
+        moved: list[Topic] = []
+        freed = 0
         for topic in self.topics:
+            moved.append(topic)
+            freed += topic.get_tokens()
+            if freed >= excess:
+                break
+        if not moved:
+            return False
+        for topic in moved:
             bulk = Bulk(history=self)
-            bulk.records.append(topic)
-            if topic.summary:
-                bulk.summary = topic.summary
-            else:
-                await bulk.summarize()
+            bulk.add_record(topic)
+            bulk.summary = topic.summary
             self.bulks.append(bulk)
-            self.topics.remove(topic)
+        del self.topics[: len(moved)]
+        self.invalidate()
         return True
 
-    async def compress_bulks(self):
+    async def compress_bulks(self, local: bool = False):
         # merge bulks if possible
-        compressed = await self.merge_bulks_by(BULK_MERGE_COUNT)
+        compressed = await self.merge_bulks_by(BULK_MERGE_COUNT, local)
         # remove oldest bulk if necessary
         if not compressed:
             self.bulks.pop(0)
+            self.invalidate()
         return compressed
 
-    async def merge_bulks_by(self, count: int):
-        if len(self.bulks) > 0:
+    async def merge_bulks_by(self, count: int, local: bool = False):
+        if len(self.bulks) <= 1:
             return False
-        bulks = await asyncio.gather(
-            *[
-                self.merge_bulks(self.bulks[i : i + count])
+        bulks = await gather_limited(
+            [
+                self.merge_bulks(self.bulks[i : i + count], local)
                 for i in range(0, len(self.bulks), count)
             ]
         )
         self.bulks = bulks
+        self.invalidate()
         return True
 
-    async def merge_bulks(self, bulks: list[Bulk]) -> Bulk:
+    async def merge_bulks(self, bulks: list[Bulk], local: bool = False) -> Bulk:
         bulk = Bulk(history=self)
-        bulk.records = cast(list[Record], bulks)
-        await bulk.summarize()
+        for b in bulks:
+            bulk.add_record(b)
+        await bulk.summarize(local)
         return bulk
 
 
-def deserialize_history(json_data: str, agent) -> History:
+async def summarize_content(agent, content, local: bool = False) -> str:
+    # summaries that would have to wait for the utility model rate limit are made locally too
+    if local or is_utility_model_saturated(agent):
+        text = "\n".join(content) if isinstance(content, list) else str(content)
+        return extractive_summary.summarize(text, SUMMARY_TO_TOPIC_RATIO)
+
+    system = agent.read_prompt("fw.topic_summary.sys.md")
+    message = agent.read_prompt("fw.topic_summary.msg.md", content=content)
+
+    # same prompts with the same model give the same summary, reuse it from disk
+    model = agent.config.utility_model
+    key = summary_cache.get_key(model.provider.name, model.name, system, message)
+    summary = await summary_cache.get(key)
+    if summary is None:
+        summary = await agent.call_utility_model(system=system, message=message)
+        if summary:
+            await summary_cache.put(key, summary)
+    return summary
+
+
+def is_utility_model_saturated(agent) -> bool:
+    model = agent.config.utility_model
+    limiter = models.get_rate_limiter(
+        model.provider,
+        model.name,
+        model.limit_requests,
+        model.limit_input,
+        model.limit_output,
+    )
+    return limiter.is_saturated()
+
+
+async def gather_limited(coros: list[Coroutine]) -> list:
+    # run summaries concurrently, a few at a time
+    limiter = asyncio.Semaphore(COMPRESS_CONCURRENCY)
+
+    async def run(coro: Coroutine):
+        async with limiter:
+            return await coro
+
+    return await asyncio.gather(*[run(c) for c in coros])
+
+
+def deserialize_history(json_data: str | dict, agent) -> History:
+    # json string from json chats, already parsed dict from binary snapshots and journals
     history = History(agent=agent)
     if json_data:
-        data = json.loads(json_data)
+        data = json.loads(json_data) if isinstance(json_data, str) else json_data
         history = History.from_dict(data, history=history)
     return history
 
@@ -399,6 +600,30 @@ def get_ctx_size_for_history() -> int:
     return int(set["chat_model_ctx_length"] * set["chat_model_ctx_history"])
 
 
+def get_ctx_watermark_for_history() -> int:
+    # soft limit where compression starts in the background
+    set = settings.get_settings()
+    return int(get_ctx_size_for_history() * set["chat_model_ctx_history_watermark"])
+
+
+def record_background_compression(seconds: float):
+    with _metrics_lock:
+        _metrics.background_runs += 1
+        _metrics.background_seconds += seconds
+
+
+def record_compression_stall(seconds: float):
+    with _metrics_lock:
+        _metrics.stalls += 1
+        _metrics.stall_seconds += seconds
+        _metrics.stall_max = max(_metrics.stall_max, seconds)
+
+
+def get_compression_metrics() -> dict:
+    with _metrics_lock:
+        return asdict(_metrics)
+
+
 def serialize_output(output: OutputMessage, ai_label="ai", human_label="human"):
     return f'{ai_label if output["ai"] else human_label}: {serialize_content(output["content"])}'
 
@@ -413,18 +638,38 @@ def serialize_content(content: MessageContent) -> str:
 
 
 def group_outputs_abab(outputs: list[OutputMessage]) -> list[OutputMessage]:
-    result = []
-    for out in outputs:
-        if result and result[-1]["ai"] == out["ai"]:
-            result[-1] = OutputMessage(
-                ai=result[-1]["ai"],
-                content=merge_outputs(result[-1]["content"], out["content"]),
+    # consecutive outputs of the same side are merged in one go, inputs are not modified
+    result: list[OutputMessage] = []
+    run: list[OutputMessage] = []
+
+    def close_run():
+        if len(run) == 1:
+            result.append(run[0])
+        elif run:
+            result.append(
+                OutputMessage(
+                    ai=run[0]["ai"], content=merge_outputs(*[o["content"] for o in run])
+                )
             )
-        else:
-            result.append(out)
+
+    for out in outputs:
+        if run and run[-1]["ai"] != out["ai"]:
+            close_run()
+            run = []
+        run.append(out)
+    close_run()
     return result
 
 
+def join_outputs(
+    a: list[OutputMessage], b: list[OutputMessage]
+) -> list[OutputMessage]:
+    # join two grouped outputs, only the boundary can need merging
+    if a and b and a[-1]["ai"] == b[0]["ai"]:
+        return a[:-1] + group_outputs_abab([a[-1], b[0]]) + b[1:]
+    return a + b
+
+
 def output_langchain(messages: list[OutputMessage]):
     result = []
     for m in messages:
@@ -439,12 +684,14 @@ def output_text(messages: list[OutputMessage], ai_label="ai", human_label="human
     return "\n".join(serialize_output(o, ai_label, human_label) for o in messages)
 
 
-def merge_outputs(a: MessageContent, b: MessageContent) -> MessageContent:
-    if not isinstance(a, list):
-        a = [a]
-    if not isinstance(b, list):
-        b = [b]
-    return a + b  # type: ignore
+def merge_outputs(*contents: MessageContent) -> MessageContent:
+    merged: list = []
+    for content in contents:
+        if isinstance(content, list):
+            merged.extend(content)
+        else:
+            merged.append(content)
+    return merged
     # return merge_properties(a, b)
 
 
@@ -1,6 +1,9 @@
+import asyncio
+import bisect
 from dataclasses import dataclass, field
 import json
-from typing import Any, Literal, Optional, Dict
+import threading
+from typing import Any, Callable, Literal, Optional, Dict
 import uuid
 from collections import OrderedDict  # Import OrderedDict
 
@@ -22,6 +25,8 @@ Type = Literal[
 
 ProgressUpdate = Literal["persistent", "temporary", "none"]
 
+DELTA_MARKS = 32  # appends remembered per text field, clients further behind get the whole field
+
 
 @dataclass
 class LogItem:
@@ -35,6 +40,12 @@ class LogItem:
     kvps: Optional[OrderedDict] = None  # Use OrderedDict for kvps
     id: Optional[str] = None  # Add id field
     guid: str = ""
+    version: int = 0  # log version of the last change of this item
+    # log version from which clients need the whole item, set on creation and when kvps are replaced
+    full_since: int = field(default=0, repr=False)
+    # per field (heading, content, ("kvps", key)): (version, shape before the append) of recent appends,
+    # shape -1 marks a replacement or appends that are not remembered anymore, see _get_shape
+    marks: dict = field(default_factory=dict, repr=False)
 
     def __post_init__(self):
         self.guid = self.log.guid
@@ -87,12 +98,122 @@ class LogItem:
             "kvps": self.kvps,
         }
 
+    def output_delta(self, version: int):
+        """Output for a client holding this item as of the given log version.
+        Unchanged fields are left out, appended ones carry only what grew after the client's copy,
+        with the shape of that copy in offsets (the length for text). Replaced fields are sent whole."""
+        if self.full_since > version:
+            return self.output()
+        out = {"no": self.no, "id": self.id, "type": self.type, "temp": self.temp, "delta": True}
+        offsets = {}
+        for key, value in (("heading", self.heading), ("content", self.content)):
+            offset = self._get_offset(key, version)
+            if offset is None:
+                continue
+            out[key] = _get_tail(value, offset) if offset != -1 else value
+            if offset != -1:
+                offsets[key] = offset
+        kvps, kvps_offsets = {}, {}
+        for key, value in (self.kvps or {}).items():
+            offset = self._get_offset(("kvps", key), version)
+            if offset is None:
+                continue
+            kvps[key] = _get_tail(value, offset) if offset != -1 else value
+            if offset != -1:
+                kvps_offsets[key] = offset
+        if kvps:
+            out["kvps"] = kvps
+        if kvps_offsets:
+            offsets["kvps"] = kvps_offsets
+        out["offsets"] = offsets
+        return out
+
+    def _track(self, key, old, new, version: int):
+        # remember appends so clients can get just what was added
+        if _is_tail_append(old, new):
+            marks = self.marks.setdefault(key, [])
+            marks.append((version, _get_shape(old)))
+            if len(marks) > DELTA_MARKS:
+                del marks[:-DELTA_MARKS]
+                marks[0] = (marks[0][0], -1)
+        else:
+            self.marks[key] = [(version, -1)]
+
+    def _get_offset(self, key, version: int) -> Any:
+        # None when unchanged since the version, -1 when the whole value is needed, shape of the client's copy otherwise
+        marks = self.marks.get(key, None)
+        if not marks or marks[-1][0] <= version:
+            return None
+        return marks[bisect.bisect_right(marks, version, key=lambda mark: mark[0])][1]
+
+
+# streamed values only grow at their end: text gets longer, lists and dicts get new items
+# or their last item grows the same way, so a copy is described by its shape and updated with the tail
+
+
+def _get_shape(value) -> Any:
+    # length of text, [length, shape of the last item] of lists and dicts, None of other values
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (list, dict)):
+        if not value:
+            return [0, None]
+        last = value[-1] if isinstance(value, list) else next(reversed(value.values()))
+        return [len(value), _get_shape(last)]
+    return None
+
+
+def _get_tail(value, shape):
+    # what was added to the value since it had the shape
+    if isinstance(value, str):
+        return value[shape:]
+    if isinstance(value, list):
+        length, last = shape
+        tail: dict = {"items": value[length:]}
+        if length:
+            tail["last"] = _get_tail(value[length - 1], last)
+        return tail
+    if isinstance(value, dict):
+        length, last = shape
+        keys = list(value)
+        tail = {"items": {k: value[k] for k in keys[length:]}}
+        if length:
+            tail["key"] = keys[length - 1]
+            tail["last"] = _get_tail(value[keys[length - 1]], last)
+        return tail
+    return value
+
+
+def _is_tail_append(old, new) -> bool:
+    if isinstance(old, str) and isinstance(new, str):
+        return new.startswith(old)
+    if isinstance(old, list) and isinstance(new, list):
+        length = len(old)
+        if len(new) < length:
+            return False
+        return not length or (
+            new[: length - 1] == old[:-1] and _is_tail_append(old[-1], new[length - 1])
+        )
+    if isinstance(old, dict) and isinstance(new, dict):
+        keys = list(old)
+        if list(new)[: len(keys)] != keys:
+            return False
+        return not keys or (
+            all(new[k] == old[k] for k in keys[:-1]) and _is_tail_append(old[keys[-1]], new[keys[-1]])
+        )
+    return type(old) is type(new) and old == new
+
 
 class Log:
 
     def __init__(self):
         self.guid: str = str(uuid.uuid4())
-        self.updates: list[int] = []
+        self.version: int = 0  # increases with every change of any item
+        # changelog, every item once in the order of its last change, so versions are ascending
+        self.changes: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.on_length_change: Callable[[], None] | None = None  # set by the owning context
         self.logs: list[LogItem] = []
         self.set_initial_progress()
 
@@ -124,8 +245,10 @@ class Log:
             id=id,  # Pass id to LogItem
         )
         self.logs.append(item)
-        self.updates += [item.no]
+        self.mark_changed(item, reset=True)
         self._update_progress_from_item(item)
+        if self.on_length_change:
+            self.on_length_change()
         return item
 
     def _update_item(
@@ -140,59 +263,146 @@ class Log:
         **kwargs,
     ):
         item = self.logs[no]
+        texts = []  # (field, old value, new value)
         if type is not None:
             item.type = type
         if update_progress is not None:
             item.update_progress = update_progress
         if heading is not None:
+            texts.append(("heading", item.heading, heading))
             item.heading = heading
         if content is not None:
+            texts.append(("content", item.content, content))
             item.content = content
+        reset = False
         if kvps is not None:
-            item.kvps = OrderedDict(kvps)  # Use OrderedDict to keep the order
+            old_kvps = item.kvps or OrderedDict()
+            new_kvps = OrderedDict(kvps)  # Use OrderedDict to keep the order
+            # streamed responses replace kvps with a grown copy, kept keys are tracked one by one
+            # so clients get appends, removed or reordered keys make them take the whole item;
+            # values are not changed in place, the ones shared with the old kvps are unchanged
+            if list(new_kvps)[: len(old_kvps)] != list(old_kvps):
+                reset = True
+            else:
+                for k, v in new_kvps.items():
+                    prev = old_kvps.get(k, None)
+                    if prev is v:
+                        continue
+                    if k not in old_kvps or prev != v:
+                        texts.append((("kvps", k), prev, v))
+            item.kvps = new_kvps
 
         if temp is not None:
             item.temp = temp
 
         if kwargs:
-            if item.kvps is None:
-                item.kvps = OrderedDict()  # Ensure kvps is an OrderedDict
+            # replaced rather than changed in place, chat saves keep a reference to the old kvps
+            kvps = OrderedDict(item.kvps or ())
             for k, v in kwargs.items():
-                item.kvps[k] = v
+                texts.append((("kvps", k), kvps.get(k, None), v))
+                kvps[k] = v
+            item.kvps = kvps
 
-        self.updates += [item.no]
+        self.mark_changed(item, texts, reset=reset)
         self._update_progress_from_item(item)
 
+    def mark_changed(self, item: LogItem, texts: list[tuple] | None = None, reset: bool = False):
+        # reset makes clients take the whole item, texts are the changed text fields
+        with self._lock:
+            self.version += 1
+            item.version = self.version
+            if reset:
+                item.full_since = self.version
+                item.marks = {}
+            for key, old, new in texts or []:
+                item._track(key, old, new, self.version)
+            self.changes[item.no] = self.version
+            self.changes.move_to_end(item.no)
+        self.notify()
+
+    def notify(self):
+        """Wake everyone waiting for a change of this log or its context, safe to call from any thread."""
+        with self._lock:
+            if not self._waiters:
+                return
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    async def wait_for_change(self, changed: Callable[[], bool], timeout: float) -> bool:
+        """Wait until changed() is true, checked on every notification. False when the timeout runs out first."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not changed():
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    return changed()
+                waiter[1].clear()
+            return True
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def changed_since(self, version: int = 0, until: int | None = None) -> list[LogItem]:
+        """Items changed after the given version in log order,
+        found from the newest change back so the cost is proportional to the number of changed items."""
+        items = []
+        with self._lock:
+            for no in reversed(self.changes):
+                item_version = self.changes[no]
+                if item_version <= version:
+                    break
+                if until is None or item_version <= until:
+                    items.append(self.logs[no])
+        items.sort(key=lambda item: item.no)  # clients apply them by position
+        return items
+
     def set_progress(self, progress: str, no: int = 0, active: bool = True):
-        self.progress = progress
         if not no:
             no = len(self.logs)
+        previous = (
+            getattr(self, "progress", None),
+            getattr(self, "progress_no", None),
+            getattr(self, "progress_active", None),
+        )
+        self.progress = progress
         self.progress_no = no
         self.progress_active = active
+        if previous != (progress, no, active):
+            self.notify()  # progress is not part of the log version, clients waiting for changes need it too
 
     def set_initial_progress(self):
         self.set_progress("Waiting for input", 0, False)
 
-    def output(self, start=None, end=None):
-        if start is None:
-            start = 0
-        if end is None:
-            end = len(self.updates)
-
-        out = []
-        seen = set()
-        for update in self.updates[start:end]:
-            if update not in seen:
-                out.append(self.logs[update].output())
-                seen.add(update)
-
-        return out
+    def output(self, start=None, end=None, delta=False):
+        # items changed after version start up to version end
+        # with delta, for a client holding the log as of start, only the changed and appended text is sent
+        items = self.changed_since(start or 0, end)
+        if not delta or not start:
+            return [item.output() for item in items]
+        with self._lock:
+            return [item.output_delta(start) for item in items]
 
     def reset(self):
-        self.guid = str(uuid.uuid4())
-        self.updates = []
-        self.logs = []
+        with self._lock:
+            self.guid = str(uuid.uuid4())
+            self.version = 0
+            self.changes = OrderedDict()
+            self.logs = []
         self.set_initial_progress()
+        self.notify()
+        if self.on_length_change:
+            self.on_length_change()
 
     def _update_progress_from_item(self, item: LogItem):
         if item.heading and item.update_progress != "none":
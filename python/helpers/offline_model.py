@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from python.helpers import files
+
+DEFAULT_RESPONSE = json.dumps(
+    {
+        "thoughts": ["Offline model, replying with a scripted response."],
+        "tool_name": "response",
+        "tool_args": {"text": "Offline response."},
+    },
+    indent=4,
+)
+EMBEDDING_DIMENSIONS = 256
+
+
+class OfflineChat(BaseChatModel):
+    """Deterministic stand-in for a chat model, no network involved.
+    Replays scripted responses in order (cycling), streamed word by word with a simulated time to first token and generation speed.
+    """
+
+    model_name: str = "offline"
+    responses: list[str] = []
+    responses_file: str = ""  # json list of responses or jsonl with one response per line
+    ttft: float = 0.0  # seconds before the first chunk
+    tokens_per_second: float = 0.0  # 0 streams without delay
+
+    _script: list[str] = PrivateAttr(default_factory=list)
+    _index: int = PrivateAttr(default=0)
+
+    def model_post_init(self, context: Any) -> None:
+        self._script = list(self.responses)
+        if self.responses_file:
+            self._script += load_responses(self.responses_file)
+        if not self._script:
+            self._script = [DEFAULT_RESPONSE]
+
+    @property
+    def _llm_type(self) -> str:
+        return "offline"
+
+    def next_response(self) -> str:
+        response = self._script[self._index % len(self._script)]
+        self._index += 1
+        return response
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(chunk.text for chunk in self._stream(messages, stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        start = time.monotonic()
+        for i, token in enumerate(split_tokens(self.next_response())):
+            delay = self._get_delay(start, i)
+            if delay > 0:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.monotonic()
+        for i, token in enumerate(split_tokens(self.next_response())):
+            delay = self._get_delay(start, i)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    def _get_delay(self, start: float, index: int) -> float:
+        # scheduled from the start so the rate does not drift with loop overhead
+        due = start + self.ttft
+        if self.tokens_per_second > 0:
+            due += index / self.tokens_per_second
+        return due - time.monotonic()
+
+
+class OfflineEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings, texts sharing words end up close to each other."""
+
+    def __init__(self, model_name: str = "offline", dimensions: int = EMBEDDING_DIMENSIONS, **kwargs):
+        self.model_name = model_name
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dimensions] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        if not norm:
+            vector[0] = norm = 1.0  # empty text still gets a unit vector
+        return [v / norm for v in vector]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+
+def split_tokens(text: str) -> list[str]:
+    # words with their leading whitespace, roughly one token each
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+def load_responses(path: str) -> list[str]:
+    with open(files.get_abs_path(path), "r", encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return [_response_text(item) for item in json.loads(content)]
+    return [_response_text(json.loads(line)) for line in content.splitlines() if line.strip()]
+
+
+def _response_text(item: Any) -> str:
+    # recorded responses can be plain strings or objects with the response text
+    if isinstance(item, dict):
+        item = item.get("response", item.get("content", ""))
+    return item if isinstance(item, str) else json.dumps(item)
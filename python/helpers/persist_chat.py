@@ -1,45 +1,370 @@
+import asyncio
+import atexit
 from collections import OrderedDict
-from typing import Any
+from dataclasses import dataclass
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable
 import uuid
+import weakref
 from agent import Agent, AgentConfig, AgentContext
-from python.helpers import files, history
+from python.helpers import chat_snapshot, dotenv, files, history
 import json
 from initialize import initialize
 
 from python.helpers.log import Log, LogItem
+from python.helpers.print_style import PrintStyle
 
 CHATS_FOLDER = "tmp/chats"
 LOG_SIZE = 1000
-CHAT_FILE_NAME = "chat.json"
+CHAT_FILE_NAME = "chat.json"  # snapshots before the binary format
+SNAPSHOT_FILE_NAME = "chat.bin"
+JOURNAL_FILE_NAME = "journal.jsonl"
+META_FILE_NAME = "meta.json"  # chat info listed before the chat is loaded
+JOURNAL_COMPACT_SIZE = 4 * 1024 * 1024  # bytes of journal folded into a new snapshot
+JOURNAL_COMPACT_ENTRIES = 2000
+SAVE_DEBOUNCE = 0.5  # seconds scheduled saves of a chat are coalesced over
+
+
+@dataclass
+class ChatInfo:
+    id: str
+    no: int = 0
+    name: str | None = None
+    updated: float = 0.0
+    size: int = 0  # bytes of snapshot and journal on disk
+    log_guid: str = ""
+    log_length: int = 0
+    log_version: int = 0
+
+
+class AgentJournal:
+    # what of an agent has been persisted already
+    def __init__(self, agent: Agent):
+        self.agent = agent
+        self.capture()
+
+    def capture(self, data: str | None = None):
+        history = self.agent.history
+        self.history = history
+        self.revision = history.revision
+        self.current = history.current
+        self.messages = len(history.current.messages)
+        self.topics = len(history.topics)
+        self.data_revision = self.agent.data_revision
+        self.data = data if data is not None else _get_data(self.agent)[0]
+
+    def get_ops(self) -> list[dict]:
+        number = self.agent.number
+        history_ops = self.get_history_ops()
+        if history_ops is None:
+            ops = [{"op": "history", "agent": number, "history": self.agent.history.to_dict()}]
+        else:
+            ops = history_ops
+        data = self.data
+        if self.agent.data_revision != self.data_revision:  # set_data was called since
+            data, plain = _get_data(self.agent)
+            if data != self.data:
+                ops.append({"op": "data", "agent": number, "data": plain})
+        self.capture(data)
+        return ops
+
+    def get_history_ops(self) -> list[dict] | None:
+        # appended messages and new topics only, None when anything else changed
+        history = self.agent.history
+        if history is not self.history or history.revision != self.revision:
+            return None
+        number = self.agent.number
+        ops = []
+        messages = self.messages
+        if history.current is not self.current:
+            if len(history.topics) != self.topics + 1 or history.topics[-1] is not self.current:
+                return None
+            closed = self.current.messages[messages:]
+            if closed:
+                ops.append(_messages_op(number, closed))
+            ops.append({"op": "topic", "agent": number})
+            messages = 0
+        added = history.current.messages[messages:]
+        if added:
+            ops.append(_messages_op(number, added))
+        return ops
+
+
+class ChatJournal:
+    # append-only record of changes since the last snapshot of a chat
+    def __init__(self, context: AgentContext, snapshot: str, log_offset: int, size: int = 0, entries: int = 0):
+        self.lock = threading.Lock()
+        self.snapshot = snapshot  # id of the snapshot the journal continues
+        self.log_offset = log_offset  # log item numbers in files are live numbers plus this
+        self.size = size
+        self.entries = entries
+        self.broken = False  # a write failed, nothing more may be appended, the next save writes a snapshot
+        self.capture(context)
+
+    def capture(self, context: AgentContext):
+        log = context.log
+        self.log_guid = log.guid
+        self.log_version = log.version
+        self.streaming_agent = _get_streaming_agent_no(context)
+        self.agents = [AgentJournal(agent) for agent in _get_agents(context)]
+
+    def get_ops(self, context: AgentContext) -> list[dict] | None:
+        # changes since the last save, None when they need a new snapshot
+        log = context.log
+        agents = _get_agents(context)
+        if log.guid != self.log_guid or len(agents) < len(self.agents):
+            return None
+        if any(agent is not state.agent for agent, state in zip(agents, self.agents)):
+            return None
+
+        ops = []
+        for state in self.agents:
+            ops += state.get_ops()
+        for agent in agents[len(self.agents) :]:
+            ops.append({"op": "agent", "agent": _serialize_agent(agent)})
+            self.agents.append(AgentJournal(agent))
+
+        version = log.version
+        updated = log.changed_since(self.log_version)
+        if updated:
+            items = []
+            for log_item in updated:
+                item = _serialize_log_item(log_item)
+                item["no"] = log_item.no + self.log_offset
+                items.append(item)
+            ops.append({"op": "log", "items": items})
+        self.log_version = version
+
+        streaming_agent = _get_streaming_agent_no(context)
+        if streaming_agent != self.streaming_agent:
+            ops.append({"op": "state", "streaming_agent": streaming_agent})
+            self.streaming_agent = streaming_agent
+        return ops
+
+
+_journals: dict[str, ChatJournal] = {}
+_data: weakref.WeakKeyDictionary[Agent, tuple[int, str, dict]] = weakref.WeakKeyDictionary()
+_data_lock = threading.Lock()
+_journals_lock = threading.Lock()
+_scheduled: dict[str, tuple[AgentContext, float]] = {}  # chats waiting for a scheduled save, with its due time
+_scheduled_lock = threading.Lock()
+# chats are encoded and written by a single thread, in the order they were captured
+_writes: queue.Queue[Callable[[], None]] = queue.Queue()
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+# persisted chats not loaded yet, by id
+_index: dict[str, ChatInfo] = {}
+_index_lock = threading.RLock()
+# persisted chats that could not be read, left on disk and never loaded or replaced by a new chat with their id
+_failed: set[str] = set()
 
 
 def get_chat_folder_path(ctxid: str):
     return files.get_abs_path(CHATS_FOLDER, ctxid)
 
+def schedule_save(context: AgentContext):
+    """Save the chat at the end of the debounce window, saves requested meanwhile are merged into it.
+    The chat is captured on the calling event loop, the current one is used as is when there is none."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        save_tmp_chat(context)
+        return
+    now = time.time()
+    with _scheduled_lock:
+        scheduled = _scheduled.get(context.id, None)
+        # a save due long ago belongs to a loop that has stopped meanwhile, schedule it again
+        if scheduled and now < scheduled[1] + SAVE_DEBOUNCE:
+            return
+        _scheduled[context.id] = (context, now + SAVE_DEBOUNCE)
+    loop.call_later(SAVE_DEBOUNCE, _save_scheduled, context.id)
+
+
 def save_tmp_chat(context: AgentContext):
-    path = _get_chat_file_path(context.id)
-    files.make_dirs(path)
-    data = _serialize_context(context)
-    js = _safe_json_serialize(data, ensure_ascii=False)
-    files.write_file(path, js)
+    """Capture changes of the chat now, they are written to disk by the background writer."""
+    with _scheduled_lock:
+        _scheduled.pop(context.id, None)
+    # only changes since the last save are appended to the journal, a full snapshot is written when it grows too big
+    # or when the chat was rewritten in a way the journal does not record (reset, replaced agents, new log)
+    with _journals_lock:
+        journal = _journals.get(context.id)
+    if journal is None:
+        _write_snapshot(context)
+        return
+    with journal.lock:
+        ops = journal.get_ops(context)
+        if (
+            ops is None
+            or journal.size > JOURNAL_COMPACT_SIZE
+            or journal.entries > JOURNAL_COMPACT_ENTRIES
+        ):
+            _write_snapshot(context)
+        elif ops:
+            _append_journal(context, journal, ops)
+
+
+def flush():
+    """Capture all scheduled saves and wait until everything captured is on disk."""
+    with _scheduled_lock:
+        scheduled = list(_scheduled.values())
+    for context, _ in scheduled:
+        try:
+            save_tmp_chat(context)
+        except Exception as e:
+            PrintStyle.error(f"Error saving chat {context.id}: {e}")
+    _writes.join()
+
+
+def _save_scheduled(ctxid: str):
+    with _scheduled_lock:
+        scheduled = _scheduled.get(ctxid, None)
+    if scheduled:  # not saved meanwhile
+        save_tmp_chat(scheduled[0])
+
 
+def _enqueue_write(write: Callable[[], None]):
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_run_writer, daemon=True, name="A0-chat-writer")
+            _writer.start()
+    _writes.put(write)
 
-def load_tmp_chats():
+
+def _run_writer():
+    while True:
+        write = _writes.get()
+        try:
+            write()
+        except Exception as e:
+            PrintStyle.error(f"Error writing chat: {e}")
+        finally:
+            _writes.task_done()
+
+
+def _write_file_atomic(path: str, content: str | bytes, sync: bool = True):
+    # a crash leaves either the old or the new file, never a partial one
+    temp = path + ".tmp"
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    with open(temp, "wb") as f:
+        f.write(content)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def index_tmp_chats(filter: Callable[[str], bool] | None = None):
+    """List persisted chats from their small meta files, each chat is loaded on first access by load_chat."""
     _convert_v080_chats()
-    folders = files.list_files("tmp/chats/", "*")
-    json_files = []
+    infos = []
+    for folder in files.list_files(CHATS_FOLDER, "*"):
+        if filter and not filter(folder):
+            continue  # chat belongs to another process
+        if not _get_snapshot_file_path(folder):
+            continue
+        try:
+            infos.append(_read_chat_info(folder))
+        except Exception as e:
+            PrintStyle.error(f"Error indexing chat {folder}: {e}")
+            with _index_lock:
+                _failed.add(folder)
+
+    # oldest first, recently used chats get the highest numbers
+    infos.sort(key=lambda info: info.updated)
+    with _index_lock:
+        for info in infos:
+            if AgentContext.get(info.id):
+                continue
+            AgentContext._counter += 1
+            info.no = AgentContext._counter
+            _index[info.id] = info
+    AgentContext.contexts_changed()
+    return [info.id for info in infos]
+
+
+def get_chat_index() -> list[ChatInfo]:
+    with _index_lock:
+        return sorted(_index.values(), key=lambda info: info.no)
+
+
+def load_chat(ctxid: str) -> AgentContext | None:
+    """Load an indexed chat into a live context, None when it is not indexed.
+    Raises when the chat cannot be read, then and on any later call for its id."""
+    with _index_lock:
+        if ctxid in _failed:
+            raise Exception(f"Chat {ctxid} could not be loaded")
+        info = _index.get(ctxid, None)
+        if not info:
+            return None
+        try:
+            data = read_snapshot(ctxid)
+            context = _deserialize_context(data, no=info.no)
+            _load_journal(context, data)
+            return context
+        except Exception as e:
+            PrintStyle.error(f"Error loading chat {ctxid}: {e}")
+            _failed.add(ctxid)
+            raise
+        finally:
+            _index.pop(ctxid, None)
+            # listed as a live context now with the same number, or not at all
+            AgentContext.contexts_changed(wake=False)
+
+
+def read_snapshot(ctxid: str) -> dict:
+    """Serialized chat from its last snapshot, journal not applied."""
+    path = _get_snapshot_file_path(ctxid)
+    if not path:
+        raise FileNotFoundError(f"Chat {ctxid} has no snapshot")
+    if path.endswith(SNAPSHOT_FILE_NAME):
+        with open(path, "rb") as f:
+            return chat_snapshot.read(f)
+    return json.loads(files.read_file(path))
+
+
+def _read_chat_info(ctxid: str) -> ChatInfo:
+    chat_path = _get_snapshot_file_path(ctxid)
+    journal_path = _get_journal_file_path(ctxid)
+    size = os.path.getsize(chat_path)
+    updated = os.path.getmtime(chat_path)
+    if os.path.exists(journal_path):
+        size += os.path.getsize(journal_path)
+        updated = max(updated, os.path.getmtime(journal_path))
+
+    info = ChatInfo(id=ctxid, updated=updated, size=size)
+    meta_path = _get_meta_file_path(ctxid)
+    if os.path.exists(meta_path):  # chats saved before meta files have no log info
+        meta = json.loads(files.read_file(meta_path))
+        info.name = meta.get("name", None)
+        info.log_guid = meta.get("log_guid", "")
+        info.log_length = meta.get("log_length", 0)
+        info.log_version = meta.get("log_version", 0)
+    return info
+
+
+def load_tmp_chats(filter: Callable[[str], bool] | None = None):
+    _convert_v080_chats()
+    folders = files.list_files(CHATS_FOLDER, "*")
+    chats = []
     for folder in folders:
-        json_files.append(_get_chat_file_path(folder))
+        if filter and not filter(folder):
+            continue  # chat belongs to another process
+        chats.append(folder)
 
     ctxids = []
-    for file in json_files:
+    for ctxid in chats:
         try:
-            js = files.read_file(file)
-            data = json.loads(js)
+            data = read_snapshot(ctxid)
             ctx = _deserialize_context(data)
+            _load_journal(ctx, data)
             ctxids.append(ctx.id)
         except Exception as e:
-            print(f"Error loading chat {file}: {e}")
+            print(f"Error loading chat {ctxid}: {e}")
     return ctxids
 
 
@@ -47,8 +372,191 @@ def _get_chat_file_path(ctxid: str):
     return files.get_abs_path(CHATS_FOLDER, ctxid, CHAT_FILE_NAME)
 
 
+def _get_snapshot_file_path(ctxid: str) -> str | None:
+    # binary snapshot, or the json one of chats not saved since
+    for name in (SNAPSHOT_FILE_NAME, CHAT_FILE_NAME):
+        path = files.get_abs_path(CHATS_FOLDER, ctxid, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _get_journal_file_path(ctxid: str):
+    return files.get_abs_path(CHATS_FOLDER, ctxid, JOURNAL_FILE_NAME)
+
+
+def _get_meta_file_path(ctxid: str):
+    return files.get_abs_path(CHATS_FOLDER, ctxid, META_FILE_NAME)
+
+
+def _serialize_meta(context: AgentContext) -> str:
+    return json.dumps(
+        {
+            "id": context.id,
+            "name": context.name,
+            "log_guid": context.log.guid,
+            "log_length": len(context.log.logs),
+            "log_version": context.log.version,
+        }
+    )
+
+
+def _write_snapshot(context: AgentContext):
+    data = _serialize_context(context)
+    snapshot = str(uuid.uuid4())
+    data["journal"] = snapshot
+    journal = ChatJournal(context, snapshot, log_offset=0)
+    with _journals_lock:
+        _journals[context.id] = journal
+    meta = _serialize_meta(context)
+
+    def write():
+        path = files.get_abs_path(CHATS_FOLDER, context.id, SNAPSHOT_FILE_NAME)
+        try:
+            files.make_dirs(path)
+            _write_file_atomic(
+                path,
+                chat_snapshot.encode(data, _get_snapshot_compression(), default=_json_default),
+            )
+        except Exception:
+            _drop_journal(context.id, journal)
+            raise
+        files.delete_file(_get_chat_file_path(context.id))  # json snapshot of an older version
+        # the old journal belongs to the previous snapshot, it is ignored on load even if this delete does not happen
+        files.delete_file(_get_journal_file_path(context.id))
+        _write_file_atomic(_get_meta_file_path(context.id), meta, sync=False)
+
+    _enqueue_write(write)
+
+
+def _append_journal(context: AgentContext, journal: ChatJournal, ops: list[dict]):
+    ctxid = context.id
+    begin = not journal.entries
+    journal.entries += len(ops) + begin
+    meta = _serialize_meta(context)
+
+    def write():
+        if journal.broken:
+            return  # would continue a snapshot that is not on disk, the changes go into the next snapshot
+        lines = []
+        if begin:
+            lines.append(json.dumps({"op": "begin", "snapshot": journal.snapshot}))
+        for op in ops:
+            lines.append(_safe_json_serialize(op, ensure_ascii=False))
+        content = "\n".join(lines) + "\n"
+        try:
+            with open(_get_journal_file_path(ctxid), "a", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            _drop_journal(ctxid, journal)  # entries after a partial one are not read on load
+            raise
+        with journal.lock:
+            journal.size += len(content)
+        _write_file_atomic(_get_meta_file_path(ctxid), meta, sync=False)
+
+    _enqueue_write(write)
+
+
+def _drop_journal(ctxid: str, journal: ChatJournal):
+    # after a failed write the next save of the chat starts over with a full snapshot
+    journal.broken = True
+    with _journals_lock:
+        if _journals.get(ctxid, None) is journal:
+            _journals.pop(ctxid, None)
+
+
+def _load_journal(context: AgentContext, data: dict):
+    # replay changes saved after the snapshot and continue the same journal
+    snapshot = data.get("journal", None)
+    log_offset = (data.get("log") or {}).get("start", 0)
+    if not snapshot:
+        return  # older chat without a journal, the next save writes a snapshot
+
+    path = _get_journal_file_path(context.id)
+    size = entries = 0
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        ops = []
+        for line in lines:
+            try:
+                ops.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # last append was interrupted
+        if ops and ops[0].get("op") == "begin" and ops[0].get("snapshot") == snapshot:
+            _replay_journal(context, ops[1:], log_offset)
+            size, entries = os.path.getsize(path), len(ops)
+
+    journal = ChatJournal(context, snapshot, log_offset, size, entries)
+    with _journals_lock:
+        _journals[context.id] = journal
+
+
+def _replay_journal(context: AgentContext, ops: list[dict], log_offset: int):
+    agents = _get_agents(context)
+    for op in ops:
+        kind = op["op"]
+        if kind == "agent":
+            agent = _deserialize_agents([op["agent"]], context.config, context)
+            agents[-1].set_data(Agent.DATA_NAME_SUBORDINATE, agent)
+            agent.set_data(Agent.DATA_NAME_SUPERIOR, agents[-1])
+            agents.append(agent)
+        elif kind == "messages":
+            current = agents[op["agent"]].history.current
+            for msg_data in op["messages"]:
+                msg = history.Message.from_dict(msg_data, history=current.history)
+                msg.parent = current
+                current.messages.append(msg)
+            current.invalidate(appended=True)
+        elif kind == "topic":
+            agents[op["agent"]].history.new_topic()
+        elif kind == "history":
+            agent = agents[op["agent"]]
+            agent.history = history.deserialize_history(op["history"], agent=agent)
+        elif kind == "data":
+            agent = agents[op["agent"]]
+            links = {k: v for k, v in agent.data.items() if k.startswith("_")}
+            agent.data = {**op["data"], **links}
+        elif kind == "log":
+            _replay_log(context.log, op, log_offset)
+        elif kind == "state":
+            number = op["streaming_agent"]
+            context.streaming_agent = agents[number] if number < len(agents) else agents[-1]
+
+
+def _replay_log(log: Log, op: dict, log_offset: int):
+    for item_data in op["items"]:
+        no = item_data["no"] - log_offset
+        if no < 0:
+            continue  # item older than the snapshot kept
+        kvps = OrderedDict(item_data["kvps"]) if item_data.get("kvps") else None
+        if no < len(log.logs):
+            item = log.logs[no]
+            item.type = item_data["type"]
+            item.heading = item_data.get("heading", "")
+            item.content = item_data.get("content", "")
+            item.kvps = kvps
+            item.temp = item_data.get("temp", False)
+        else:
+            no = len(log.logs)
+            log.logs.append(
+                LogItem(
+                    log=log,
+                    no=no,
+                    type=item_data["type"],
+                    heading=item_data.get("heading", ""),
+                    content=item_data.get("content", ""),
+                    kvps=kvps,
+                    temp=item_data.get("temp", False),
+                )
+            )
+        log.mark_changed(log.logs[no], reset=True)
+
+
 def _convert_v080_chats():
-    json_files = files.list_files("tmp/chats", "*.json")
+    json_files = files.list_files(CHATS_FOLDER, "*.json")
     for file in json_files:
         path = files.get_abs_path(CHATS_FOLDER, file)
         name = file.rstrip(".json")
@@ -70,37 +578,85 @@ def load_json_chats(jsons: list[str]):
 
 def export_json_chat(context: AgentContext):
     data = _serialize_context(context)
-    js = _safe_json_serialize(data, ensure_ascii=False)
-    return js
+    return _encode_context(data)
 
 
 def remove_chat(ctxid):
-    files.delete_dir(get_chat_folder_path(ctxid))
+    with _scheduled_lock:
+        _scheduled.pop(ctxid, None)
+    with _journals_lock:
+        _journals.pop(ctxid, None)
+    with _index_lock:
+        _failed.discard(ctxid)
+        if _index.pop(ctxid, None):
+            AgentContext.contexts_changed()
+    # after the writes already captured for the chat
+    _enqueue_write(lambda: files.delete_dir(get_chat_folder_path(ctxid)))
 
 
 
 def _serialize_context(context: AgentContext):
     # serialize agents
-    agents = []
-    agent = context.agent0
-    while agent:
-        agents.append(_serialize_agent(agent))
-        agent = agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
+    agents = [_serialize_agent(agent) for agent in _get_agents(context)]
 
     return {
         "id": context.id,
         "agents": agents,
-        "streaming_agent": (
-            context.streaming_agent.number if context.streaming_agent else 0
-        ),
+        "streaming_agent": _get_streaming_agent_no(context),
         "log": _serialize_log(context.log),
     }
 
 
+def _get_agents(context: AgentContext) -> list[Agent]:
+    agents = []
+    agent = context.agent0
+    while agent:
+        agents.append(agent)
+        agent = agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
+    return agents
+
+
+def _get_streaming_agent_no(context: AgentContext) -> int:
+    return context.streaming_agent.number if context.streaming_agent else 0
+
+
+# agent data rebuilt by the agent loop from the rest of the chat, large and changing every iteration
+TRANSIENT_DATA = {Agent.DATA_NAME_CTX_WINDOW}
+
+
+def _get_data(agent: Agent) -> tuple[str, dict]:
+    # serialized and plain copy of the data, made once per revision and shared by journal and snapshots
+    with _data_lock:
+        cached = _data.get(agent, None)
+    if cached and cached[0] == agent.data_revision:
+        return cached[1], cached[2]
+    revision = agent.data_revision
+    serialized = _serialize_data(agent)
+    plain = json.loads(serialized)
+    with _data_lock:
+        _data[agent] = (revision, serialized, plain)
+    return serialized, plain
+
+
+def _serialize_data(agent: Agent) -> str:
+    # underscored data links agents and running tasks
+    data = {
+        k: v
+        for k, v in agent.data.items()
+        if not k.startswith("_") and k not in TRANSIENT_DATA
+    }
+    return _safe_json_serialize(data, ensure_ascii=False)
+
+
+def _messages_op(number: int, messages: list[history.Message]) -> dict:
+    return {"op": "messages", "agent": number, "messages": [m.to_dict() for m in messages]}
+
+
 def _serialize_agent(agent: Agent):
-    data = {k: v for k, v in agent.data.items() if not k.startswith("_")}
+    # plain structures of the moment, encoded later by chat_snapshot or _encode_context
+    data = _get_data(agent)[1]
 
-    history = agent.history.serialize()
+    history = agent.history.to_dict()
 
     return {
         "number": agent.number,
@@ -109,18 +665,34 @@ def _serialize_agent(agent: Agent):
     }
 
 
+def _encode_agent(agent: dict) -> dict:
+    # history is a json string inside json chats
+    return {**agent, "history": json.dumps(agent["history"])}
+
+
+def _encode_context(data: dict) -> str:
+    data = {**data, "agents": [_encode_agent(agent) for agent in data["agents"]]}
+    return _safe_json_serialize(data, ensure_ascii=False)
+
+
+def _serialize_log_item(item: LogItem) -> dict:
+    # kvps are replaced on updates, never changed in place, so the writer can take the item's own
+    return item.output()
+
+
 def _serialize_log(log: Log):
     return {
         "guid": log.guid,
+        "start": max(0, len(log.logs) - LOG_SIZE),  # number of the first item kept
         "logs": [
-            item.output() for item in log.logs[-LOG_SIZE:]
+            _serialize_log_item(item) for item in log.logs[-LOG_SIZE:]
         ],  # serialize LogItem objects
         "progress": log.progress,
         "progress_no": log.progress_no,
     }
 
 
-def _deserialize_context(data):
+def _deserialize_context(data, no: int = 0):
     config = initialize()
     log = _deserialize_log(data.get("log", None))
 
@@ -130,6 +702,7 @@ def _deserialize_context(data):
         name=data.get("name", None),
         log=log,
         paused=False,
+        no=no,
         # agent0=agent0,
         # streaming_agent=straming_agent,
     )
@@ -205,28 +778,44 @@ def _deserialize_log(data: dict[str, Any]) -> "Log":
                 temp=item_data.get("temp", False),
             )
         )
-        log.updates.append(i)
+        log.mark_changed(log.logs[-1], reset=True)
         i += 1
 
     return log
 
 
 def _safe_json_serialize(obj, **kwargs):
-    def serializer(o):
-        if isinstance(o, dict):
-            return {k: v for k, v in o.items() if is_json_serializable(v)}
-        elif isinstance(o, (list, tuple)):
-            return [item for item in o if is_json_serializable(item)]
-        elif is_json_serializable(o):
-            return o
-        else:
-            return None  # Skip this property
+    return json.dumps(obj, default=_json_default, **kwargs)
+
+
+def _json_default(o):
+    # fallback for values json cannot encode, used for the journal and snapshots alike
+    if isinstance(o, dict):
+        return {k: v for k, v in o.items() if _is_json_serializable(v)}
+    elif isinstance(o, (list, tuple)):
+        return [item for item in o if _is_json_serializable(item)]
+    elif _is_json_serializable(o):
+        return o
+    else:
+        return None  # Skip this property
+
+
+def _is_json_serializable(item):
+    try:
+        json.dumps(item)
+        return True
+    except (TypeError, OverflowError):
+        return False
+
+
+def _get_snapshot_compression() -> int:
+    # zlib unless zstd is asked for, snapshots must stay readable where zstandard is missing
+    name = (dotenv.get_dotenv_value("CHAT_COMPRESSION") or "zlib").lower()
+    if name == "zstd":
+        if chat_snapshot.zstandard:
+            return chat_snapshot.COMPRESSION_ZSTD
+        PrintStyle.error("CHAT_COMPRESSION=zstd needs zstandard installed, using zlib.")
+    return chat_snapshot.COMPRESSION_ZLIB
 
-    def is_json_serializable(item):
-        try:
-            json.dumps(item)
-            return True
-        except (TypeError, OverflowError):
-            return False
 
-    return json.dumps(obj, default=serializer, **kwargs)
+atexit.register(flush)
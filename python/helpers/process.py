@@ -4,20 +4,31 @@ from python.helpers import runtime
 from python.helpers.print_style import PrintStyle
 
 _server = None
+_workers = None
 
 def set_server(server):
     global _server
     _server = server
 
+def set_workers(workers):
+    global _workers
+    _workers = workers
+
 def get_server(server):
     global _server
     return _server
 
 def stop_server():
-    global _server
+    global _server, _workers
     if _server:
         _server.shutdown()
         _server = None
+    if _workers:
+        _workers.stop()
+        _workers = None
+    # chats saved but not written yet, restarting replaces the process without exit handlers
+    from python.helpers import persist_chat
+    persist_chat.flush()
 
 def reload():
     stop_server()
@@ -1,4 +1,5 @@
 import asyncio
+import threading
 import time
 from typing import Callable, Awaitable
 
@@ -8,28 +9,41 @@ class RateLimiter:
         self.timeframe = seconds
         self.limits = {key: value if isinstance(value, (int, float)) else 0 for key, value in (limits or {}).items()}
         self.values = {key: [] for key in self.limits.keys()}
-        self._lock = asyncio.Lock()
+        self._lock = threading.Lock()  # limiters are shared by all agent event loops
 
     def add(self, **kwargs: int):
         now = time.time()
-        for key, value in kwargs.items():
-            if not key in self.values:
-                self.values[key] = []
-            self.values[key].append((now, value))
+        with self._lock:
+            for key, value in kwargs.items():
+                if not key in self.values:
+                    self.values[key] = []
+                self.values[key].append((now, value))
 
     async def cleanup(self):
-        async with self._lock:
+        with self._lock:
             now = time.time()
             cutoff = now - self.timeframe
             for key in self.values:
                 self.values[key] = [(t, v) for t, v in self.values[key] if t > cutoff]
 
     async def get_total(self, key: str) -> int:
-        async with self._lock:
+        with self._lock:
             if not key in self.values:
                 return 0
             return sum(value for _, value in self.values[key])
 
+    def is_saturated(self) -> bool:
+        """True if a request made now would have to wait for any limit."""
+        cutoff = time.time() - self.timeframe
+        with self._lock:
+            for key, limit in self.limits.items():
+                if limit <= 0:
+                    continue
+                total = sum(v for t, v in self.values.get(key, []) if t > cutoff)
+                if total >= limit:
+                    return True
+        return False
+
     async def wait(
         self,
         callback: Callable[[str, str, int, int], Awaitable[None]] | None = None,
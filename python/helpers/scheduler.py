@@ -0,0 +1,142 @@
+import asyncio
+from dataclasses import dataclass
+import threading
+import time
+import zlib
+
+from python.helpers import dotenv, runtime
+from python.helpers.defer import EventLoopThread
+
+THREAD_NAME = "AgentContext"
+DEFAULT_LOOPS = 4
+LAG_CHECK_INTERVAL = 0.5  # seconds between lag probes of each loop
+LAG_SMOOTHING = 0.2  # weight of the latest probe in the average lag
+SATURATED_LAG = 0.25  # average lag in seconds from which a loop counts as saturated
+
+
+@dataclass
+class LoopStats:
+    no: int
+    lag: float = 0.0
+    lag_avg: float = 0.0
+    lag_max: float = 0.0
+    loop: asyncio.AbstractEventLoop | None = None
+
+
+_stats: dict[int, LoopStats] = {}
+_moved: dict[str, int] = {}  # contexts moved away from their hashed loop
+_lock = threading.RLock()
+
+
+def get_loops_count() -> int:
+    count = (
+        runtime.get_arg("agent_loops")
+        or dotenv.get_dotenv_value("AGENT_LOOPS")
+        or DEFAULT_LOOPS
+    )
+    return max(1, int(count))
+
+
+def get_thread_name(ctxid: str) -> str:
+    """Event loop thread for the next task of a context.
+    Contexts are spread over the loops by a stable hash of their id, a context whose loop is saturated is moved to the least loaded one."""
+    with _lock:
+        no = get_loop_no(ctxid)
+        if is_saturated(no):
+            target = _get_least_loaded()
+            if not is_saturated(target):
+                no = move_context(ctxid, target)
+        _start_monitor(no)
+        return _get_thread_name(no)
+
+
+def get_loop_no(ctxid: str) -> int:
+    count = get_loops_count()
+    with _lock:
+        no = _moved.get(ctxid, None)
+        if no is None or no >= count:
+            no = zlib.crc32(ctxid.encode()) % count
+        return no
+
+
+def move_context(ctxid: str, loop_no: int | None = None) -> int:
+    """Assign a context to another loop, the least loaded one by default.
+    A running task stays where it is, the assignment applies from the next task of the context."""
+    with _lock:
+        if loop_no is None:
+            loop_no = _get_least_loaded()
+        loop_no = loop_no % get_loops_count()
+        if loop_no == zlib.crc32(ctxid.encode()) % get_loops_count():
+            _moved.pop(ctxid, None)
+        else:
+            _moved[ctxid] = loop_no
+        return loop_no
+
+
+def forget_context(ctxid: str):
+    with _lock:
+        _moved.pop(ctxid, None)
+
+
+def is_saturated(loop_no: int) -> bool:
+    stats = _stats.get(loop_no, None)
+    return bool(stats and stats.lag_avg > SATURATED_LAG)
+
+
+def get_metrics() -> list[dict]:
+    from agent import AgentContext
+
+    contexts = [0] * get_loops_count()
+    running = [0] * get_loops_count()
+    for ctx in list(AgentContext._contexts.values()):
+        no = get_loop_no(ctx.id)
+        contexts[no] += 1
+        if ctx.task and ctx.task.is_alive():
+            running[no] += 1
+
+    result = []
+    for no in range(get_loops_count()):
+        stats = _stats.get(no, LoopStats(no))
+        result.append(
+            {
+                "no": no,
+                "thread": _get_thread_name(no),
+                "lag": stats.lag,
+                "lag_avg": stats.lag_avg,
+                "lag_max": stats.lag_max,
+                "saturated": is_saturated(no),
+                "contexts": contexts[no],
+                "running": running[no],
+            }
+        )
+    return result
+
+
+def _get_thread_name(loop_no: int) -> str:
+    return f"{THREAD_NAME}-{loop_no}"
+
+
+def _get_least_loaded() -> int:
+    return min(
+        range(get_loops_count()),
+        key=lambda no: _stats[no].lag_avg if no in _stats else 0.0,
+    )
+
+
+def _start_monitor(loop_no: int):
+    # (re)start the lag probe whenever the loop of the thread is new
+    thread = EventLoopThread(_get_thread_name(loop_no))
+    stats = _stats.setdefault(loop_no, LoopStats(loop_no))
+    if stats.loop is not thread.loop:
+        stats.loop = thread.loop
+        thread.run_coroutine(_monitor(stats))
+
+
+async def _monitor(stats: LoopStats):
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(LAG_CHECK_INTERVAL)
+        lag = max(0.0, time.monotonic() - start - LAG_CHECK_INTERVAL)
+        stats.lag = lag
+        stats.lag_avg += LAG_SMOOTHING * (lag - stats.lag_avg)
+        stats.lag_max = max(stats.lag_max, lag)
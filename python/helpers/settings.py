@@ -16,6 +16,7 @@ class Settings(TypedDict):
     chat_model_kwargs: dict[str, str]
     chat_model_ctx_length: int
     chat_model_ctx_history: float
+    chat_model_ctx_history_watermark: float
     chat_model_rl_requests: int
     chat_model_rl_input: int
     chat_model_rl_output: int
@@ -149,6 +150,19 @@ def convert_out(settings: Settings) -> SettingsOutput:
         }
     )
 
+    chat_model_fields.append(
+        {
+            "id": "chat_model_ctx_history_watermark",
+            "title": "History compression watermark",
+            "description": "Portion of the chat history space at which history compression starts in the background. The agent only waits for compression when the history space is full.",
+            "type": "range",
+            "min": 0.5,
+            "max": 1,
+            "step": 0.01,
+            "value": settings["chat_model_ctx_history_watermark"],
+        }
+    )
+
     chat_model_fields.append(
         {
             "id": "chat_model_rl_requests",
@@ -709,11 +723,26 @@ def get_settings() -> Settings:
 
 def set_settings(settings: Settings):
     global _settings
+    previous = _settings
     _settings = normalize_settings(settings)
+    # compare before writing, api keys are removed from settings when saved
+    if _models_changed(previous, _settings):
+        models.clear_model_cache()
     _write_settings_file(_settings)
     _apply_settings()
 
 
+def reload_settings():
+    # settings were changed by another process, read them again
+    global _settings
+    previous = _settings
+    dotenv.load_dotenv()
+    _settings = None
+    if _models_changed(previous, get_settings()):
+        models.clear_model_cache()
+    _apply_settings(preload_stt=False)
+
+
 def normalize_settings(settings: Settings) -> Settings:
     copy = settings.copy()
     default = get_default_settings()
@@ -728,6 +757,19 @@ def normalize_settings(settings: Settings) -> Settings:
     return copy
 
 
+def _models_changed(previous: Settings | None, current: Settings) -> bool:
+    if not previous:
+        return True
+    for key in current.keys():
+        if key.endswith(("_model_provider", "_model_name", "_model_kwargs")):
+            if previous.get(key) != current.get(key):
+                return True
+    for key, val in current["api_keys"].items():
+        if (dotenv.get_dotenv_value(key.upper()) or "") != val:
+            return True
+    return False
+
+
 def _read_settings_file() -> Settings | None:
     if os.path.exists(SETTINGS_FILE):
         content = files.read_file(SETTINGS_FILE)
@@ -777,6 +819,7 @@ def get_default_settings() -> Settings:
         chat_model_kwargs={ "temperature": "0" },
         chat_model_ctx_length=120000,
         chat_model_ctx_history=0.7,
+        chat_model_ctx_history_watermark=0.8,
         chat_model_rl_requests=0,
         chat_model_rl_input=0,
         chat_model_rl_output=0,
@@ -817,7 +860,7 @@ def get_default_settings() -> Settings:
     )
 
 
-def _apply_settings():
+def _apply_settings(preload_stt: bool = True):
     global _settings
     if _settings:
         from agent import AgentContext
@@ -832,9 +875,10 @@ def _apply_settings():
                 agent = agent.get_data(agent.DATA_NAME_SUBORDINATE)
 
         # reload whisper model if necessary
-        task = defer.DeferredTask().start_task(
-            whisper.preload, _settings["stt_model_size"]
-        )  # TODO overkill, replace with background task
+        if preload_stt:
+            task = defer.DeferredTask().start_task(
+                whisper.preload, _settings["stt_model_size"]
+            )  # TODO overkill, replace with background task
 
 
 def _env_to_dict(data: str):
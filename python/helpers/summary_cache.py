@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+from python.helpers import files
+
+CACHE_FILE = "tmp/cache/summaries.db"
+MAX_SIZE = 64 * 1024 * 1024  # bytes of summaries kept, least recently used ones are evicted over this
+EVICT_TO_RATIO = 0.9  # eviction frees some headroom so it does not run on every insert
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+_size: int | None = None
+
+
+def get_key(*parts: str) -> str:
+    # summaries depend only on the model and the exact prompts
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+async def get(key: str) -> str | None:
+    return await asyncio.to_thread(get_sync, key)
+
+
+async def put(key: str, summary: str):
+    await asyncio.to_thread(put_sync, key, summary)
+
+
+def get_sync(key: str) -> str | None:
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE summaries SET accessed = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return row[0]
+
+
+def put_sync(key: str, summary: str):
+    global _size
+    size = len(summary.encode("utf-8", "surrogatepass"))
+    with _lock:
+        conn = _get_conn()
+        current = _get_size(conn)
+        old = conn.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO summaries (key, summary, size, accessed) VALUES (?, ?, ?, ?)",
+            (key, summary, size, time.time()),
+        )
+        _size = current + size - (old[0] if old else 0)
+        if _size > MAX_SIZE:
+            _evict(conn, int(MAX_SIZE * EVICT_TO_RATIO))
+        conn.commit()
+
+
+def clear():
+    global _size
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM summaries")
+        conn.commit()
+        _size = 0
+
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        files.make_dirs(CACHE_FILE)
+        # shared by all event loop threads under the lock, worker processes get their own connection
+        _conn = sqlite3.connect(
+            files.get_abs_path(CACHE_FILE), timeout=10, check_same_thread=False
+        )
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS summaries_accessed ON summaries (accessed)")
+        _conn.commit()
+    return _conn
+
+
+def _get_size(conn: sqlite3.Connection) -> int:
+    if _size is None:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+    return _size
+
+
+def _evict(conn: sqlite3.Connection, target: int):
+    global _size
+    # oldest accessed first, until the total is down to the target
+    freed = 0
+    over = (_size or 0) - target
+    keys = []
+    for key, size in conn.execute("SELECT key, size FROM summaries ORDER BY accessed"):
+        if freed >= over:
+            break
+        keys.append((key,))
+        freed += size
+    conn.executemany("DELETE FROM summaries WHERE key = ?", keys)
+    _size = (_size or 0) - freed
@@ -1,19 +1,228 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import re
+import threading
+from typing import Callable
+
 import tiktoken
 
+from python.helpers import dotenv, files
+from python.helpers.print_style import PrintStyle
+
 APPROX_BUFFER = 1.1
+DEFAULT_ENCODING = "cl100k_base"
+DEFAULT_ESTIMATOR = "exact"
+TOKENS_CACHE_SIZE = 4096
+CACHE_MIN_LENGTH = 64  # shorter texts are cheaper to count again than to hash
+BATCH_THREADS = 4
+BATCH_CHUNK = 16  # texts per pool task
+CALIBRATION_FOLDER = "prompts/default"  # the fast estimator is fitted on these texts when it is selected
+
+# fast estimator model, tokens = sum of feature counts times weights
+# defaults follow cl100k_base on english prose and code, calibrate() refits them against the exact encoder
+FAST_WEIGHTS = {
+    "words": 0.75,  # ascii letter runs, most common words are one token
+    "letters": 0.12,  # long and rare words split into more tokens
+    "digit_groups": 1.0,  # numbers are split into groups of up to 3 digits
+    "punctuation": 0.8,  # mostly one token each, sometimes merged with neighbours
+    "newlines": 0.5,
+    "whitespace": 0.25,  # indentation and other whitespace beyond single spaces
+    "non_ascii": 1.0,  # CJK and other scripts are about one token per character
+}
+
+_WORD = re.compile(r"[A-Za-z]+")
+_DIGITS = re.compile(r"[0-9]+")
+_PUNCT = re.compile(r"[!-/:-@\[-`{-~]")
+_WHITESPACE = re.compile(r"\s{2,}")
+
+_estimators: dict[str, Callable[[str], int]] = {}
+_estimator: str = ""
+_calibrated = False
+_cache: OrderedDict[tuple, int] = OrderedDict()
+_cache_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def count_tokens(text: str, encoding_name=DEFAULT_ENCODING) -> int:
+    if not text:
+        return 0
+
+    # Get the encoding
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    # Encode the text and count the tokens, special tokens are counted as plain text
+    return len(encoding.encode_ordinary(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast heuristic token count from character classes, no tokenizer involved."""
+    if not text:
+        return 0
+    features = get_features(text)
+    return max(1, round(sum(FAST_WEIGHTS[key] * value for key, value in features.items())))
+
+
+def get_features(text: str) -> dict[str, int]:
+    words = _WORD.findall(text)
+    return {
+        "words": len(words),
+        "letters": sum(map(len, words)),
+        "digit_groups": sum((len(d) + 2) // 3 for d in _DIGITS.findall(text)),
+        "punctuation": len(_PUNCT.findall(text)),
+        "newlines": text.count("\n"),
+        "whitespace": sum(len(w) - 1 for w in _WHITESPACE.findall(text)),
+        "non_ascii": len(text) - len(text.encode("ascii", "ignore")),
+    }
+
+
+def calibrate(samples: list[str]) -> dict[str, float]:
+    """Refit the fast estimator weights on sample texts against the exact encoder.
+    Features the samples do not have keep their weights."""
+    import numpy as np
+
+    features = [get_features(s) for s in samples]
+    keys = [key for key in FAST_WEIGHTS if any(f[key] for f in features)]
+    x = np.array([[f[k] for k in keys] for f in features], dtype=float)
+    y = np.array(count_batch(samples, "exact"), dtype=float)
+    weights, *_ = np.linalg.lstsq(x, y, rcond=None)
+    for key, weight in zip(keys, weights):
+        FAST_WEIGHTS[key] = max(0.0, float(weight))
+    clear_cache()
+    return dict(FAST_WEIGHTS)
+
+
+def register_estimator(name: str, estimator: Callable[[str], int]):
+    _estimators[name] = estimator
+
+
+def set_estimator(name: str):
+    global _estimator
+    if name not in _estimators:
+        raise ValueError(f"Unknown token estimator '{name}'")
+    if name == "fast":
+        _calibrate_fast()
+    _estimator = name
+
+
+def get_estimator() -> str:
+    global _estimator
+    if not _estimator:
+        # TOKENS_ESTIMATOR in .env: exact (tiktoken) or fast (heuristic)
+        set_estimator(dotenv.get_dotenv_value("TOKENS_ESTIMATOR") or DEFAULT_ESTIMATOR)
+    return _estimator
+
+
+def count(text: str, estimator: str = "") -> int:
+    """Token count by the selected estimator, long texts are cached by content hash."""
+    if not text:
+        return 0
+    estimator = estimator or get_estimator()
+    if len(text) < CACHE_MIN_LENGTH:
+        return _estimators[estimator](text)
+
+    key = _get_cache_key(estimator, text)
+    with _cache_lock:
+        result = _cache.get(key, None)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+
+    result = _estimators[estimator](text)
+    _cache_put(key, result)
+    return result
+
+
+def count_batch(texts: list[str], estimator: str = "") -> list[int]:
+    """Token counts of many texts, cache misses of the exact estimator are encoded on a thread pool."""
+    estimator = estimator or get_estimator()
+    results: list[int | None] = [None] * len(texts)
+    keys: list[tuple | None] = [None] * len(texts)
+    missing: list[int] = []
+
+    with _cache_lock:
+        for i, text in enumerate(texts):
+            if not text:
+                results[i] = 0
+                continue
+            if len(text) >= CACHE_MIN_LENGTH:
+                keys[i] = key = _get_cache_key(estimator, text)
+                cached = _cache.get(key, None)
+                if cached is not None:
+                    _cache.move_to_end(key)
+                    results[i] = cached
+                    continue
+            missing.append(i)
+
+    func = _estimators[estimator]
+    if estimator == "exact" and len(missing) > BATCH_CHUNK:
+        # tiktoken releases the GIL while encoding, threads scale here
+        chunks = [missing[i : i + BATCH_CHUNK] for i in range(0, len(missing), BATCH_CHUNK)]
+        counted = _get_executor().map(lambda chunk: [func(texts[i]) for i in chunk], chunks)
+        values = [value for chunk in counted for value in chunk]
+    else:
+        values = [func(texts[i]) for i in missing]
+
+    for i, value in zip(missing, values):
+        results[i] = value
+        key = keys[i]
+        if key:
+            _cache_put(key, value)
+    return results  # type: ignore
+
+
+def approximate_tokens(text: str) -> int:
+    return int(count(text) * APPROX_BUFFER)
+
+
+def approximate_tokens_batch(texts: list[str]) -> list[int]:
+    return [int(value * APPROX_BUFFER) for value in count_batch(texts)]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _calibrate_fast():
+    # fit the fast estimator to the exact encoder once, on the prompts it mostly counts
+    global _calibrated
+    if _calibrated:
+        return
+    _calibrated = True
+    try:
+        samples = []
+        for file in sorted(files.list_files(CALIBRATION_FOLDER, "*.md")):
+            with open(files.get_abs_path(CALIBRATION_FOLDER, file), encoding="utf-8") as f:
+                samples.append(f.read())
+        if samples:
+            calibrate(samples)
+    except Exception as e:
+        # the default weights are used, e.g. when the encoding cannot be downloaded
+        PrintStyle.error(f"Token estimator calibration failed: {e}")
+
+
+def _get_cache_key(estimator: str, text: str) -> tuple:
+    digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    return (estimator, len(text), digest)
+
+
+def _cache_put(key: tuple, value: int):
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > TOKENS_CACHE_SIZE:
+            _cache.popitem(last=False)  # drop least recently used
 
-def count_tokens(text: str, encoding_name="cl100k_base") -> int:
-        if not text:
-            return 0
-    
-        # Get the encoding
-        encoding = tiktoken.get_encoding(encoding_name)
 
-        # Encode the text and count the tokens
-        tokens = encoding.encode(text)
-        token_count = len(tokens)
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:  # batches are counted from several loop threads, only one pool is created
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BATCH_THREADS, thread_name_prefix="tokens")
+        return _executor
 
-        return token_count
 
-def approximate_tokens(text: str, ) -> int:
-    return int(count_tokens(text) * APPROX_BUFFER)
\ No newline at end of file
+register_estimator("exact", count_tokens)
+register_estimator("fast", estimate_tokens)
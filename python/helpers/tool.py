@@ -11,6 +11,9 @@ class Response:
     
 class Tool:
 
+    # tool has no side effects on the agent and can run alongside other concurrent tools
+    concurrent: bool = False
+
     def __init__(self, agent: Agent, name: str, args: dict[str,str], message: str, **kwargs) -> None:
         self.agent = agent
         self.name = name
@@ -0,0 +1,331 @@
+import asyncio
+from concurrent.futures import Future
+from dataclasses import dataclass
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+import zlib
+from typing import Any
+
+from flask import Request, Response
+from python.helpers import errors
+from python.helpers.print_style import PrintStyle
+
+# api handlers bound to an agent context, they run in the worker process owning the context
+CONTEXT_HANDLERS = [
+    "chat_export",
+    "chat_load",
+    "chat_remove",
+    "chat_reset",
+    "ctx_window_get",
+    "history_get",
+    "import_knowledge",
+    "message",
+    "message_async",
+    "nudge",
+    "pause",
+    "poll",
+    "poll_wait",
+]
+# api handlers answering with the contexts of all workers
+POLL_HANDLERS = ["poll", "poll_wait"]
+# api handlers changing settings, workers reload them afterwards
+SETTINGS_HANDLERS = ["settings_set"]
+
+CONTEXTS_REFRESH = 0.5  # seconds to reuse context lists of workers not serving the poll
+STOP_TIMEOUT = 10  # seconds to wait for a worker to flush and exit
+
+
+@dataclass
+class WorkerRequest:
+    handler: str
+    method: str
+    path: str
+    query: str
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+@dataclass
+class WorkerResponse:
+    status: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+def get_worker_no(ctxid: str, count: int) -> int:
+    return zlib.crc32(ctxid.encode()) % count
+
+
+class Worker:
+    def __init__(self, no: int, count: int, args: dict):
+        mp = multiprocessing.get_context("spawn")
+        self.no = no
+        self.conn, child_conn = mp.Pipe()
+        self.process = mp.Process(
+            target=_worker_main,
+            args=(no, count, child_conn, args),
+            name=f"A0-worker-{no}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.futures: dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(
+            target=self._read, daemon=True, name=f"A0-worker-{no}-reader"
+        )
+        self.reader.start()
+
+    async def call(self, command: str, payload: Any = None) -> Any:
+        future: Future = Future()
+        req_id = str(uuid.uuid4())
+        with self.lock:
+            self.futures[req_id] = future
+            self.conn.send((req_id, command, payload))
+        return await asyncio.wrap_future(future)
+
+    def stop(self):
+        try:
+            with self.lock:
+                self.conn.send(("", "stop", None))
+        except (OSError, ValueError):
+            pass
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def _read(self):
+        while True:
+            try:
+                req_id, result, error = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future = self.futures.pop(req_id, None)
+            if future:
+                if error:
+                    future.set_exception(Exception(error))
+                else:
+                    future.set_result(result)
+
+        # worker is gone, fail everything still waiting for it
+        with self.lock:
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.set_exception(Exception(f"Worker {self.no} has exited."))
+
+
+class WorkerPool:
+    def __init__(self, count: int):
+        from python.helpers import runtime
+
+        self.workers = [Worker(no, count, runtime.args) for no in range(count)]
+        self.owners: dict[str, int] = {}  # contexts created outside their hashed worker
+        self.contexts: dict[int, tuple[float, str, list]] = {}  # time, version, contexts
+        self._next = 0
+
+    def get_owner(self, ctxid: str) -> int:
+        if not ctxid:
+            return 0  # default context lives in the first worker
+        owner = self.owners.get(ctxid, None)
+        if owner is None:
+            owner = get_worker_no(ctxid, len(self.workers))
+        return owner
+
+    async def forward(self, handler: str, request: Request) -> Response:
+        body = request.get_data()  # cache before form data is parsed
+        ctxid = _get_ctxid(request)
+        if handler == "chat_load":
+            # new contexts, spread round robin
+            no = self._next
+            self._next = (self._next + 1) % len(self.workers)
+        else:
+            no = self.get_owner(ctxid)
+
+        headers = list(request.headers.items())
+        known_version = None
+        if handler in POLL_HANDLERS:
+            # clients hold one version for the merged list, made of the versions of all workers
+            input = json.loads(body or "{}")
+            known_version = input.get("contexts_version", None)
+            parts = known_version.split(".") if isinstance(known_version, str) else []
+            input["contexts_version"] = parts[no] if len(parts) == len(self.workers) else None
+            body = json.dumps(input).encode()
+            # the body changed and the etag is checked against the merged output here
+            headers = [
+                (k, v) for k, v in headers if k.lower() not in ("content-length", "if-none-match")
+            ]
+
+        try:
+            result: WorkerResponse = await self.workers[no].call(
+                "request",
+                WorkerRequest(
+                    handler=handler,
+                    method=request.method,
+                    path=request.path,
+                    query=request.query_string.decode(),
+                    headers=headers,
+                    body=body,
+                ),
+            )
+        except Exception as e:
+            error = errors.format_error(e)
+            PrintStyle.error(error)
+            return Response(response=error, status=500, mimetype="text/plain")
+
+        response = Response(
+            response=result.body, status=result.status, headers=result.headers
+        )
+        if response.mimetype == "application/json" and response.status_code == 200:
+            output = json.loads(result.body)
+            self._learn_owners(no, handler, ctxid, output)
+            if handler in POLL_HANDLERS:
+                from python.api.poll import get_conditional_response
+
+                version, contexts = await self._merge_contexts(no, output)
+                output["contexts_version"] = version
+                output.pop("contexts", None)
+                if version != known_version:
+                    output["contexts"] = contexts
+                return get_conditional_response(output, request.headers.get("If-None-Match", ""))
+        return response
+
+    async def broadcast(self, command: str, payload: Any = None):
+        return await asyncio.gather(
+            *[worker.call(command, payload) for worker in self.workers],
+            return_exceptions=True,
+        )
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def _learn_owners(self, no: int, handler: str, ctxid: str, output: dict):
+        if handler == "chat_remove":
+            self.owners.pop(ctxid, None)
+            return
+        ctxids = list(output.get("ctxids", []))
+        if output.get("context", None):
+            ctxids.append(output["context"])
+        for ctx in output.get("contexts", []):
+            ctxids.append(ctx["id"])
+        for id in ctxids:
+            if get_worker_no(id, len(self.workers)) != no:
+                self.owners[id] = no
+
+    async def _merge_contexts(self, no: int, output: dict) -> tuple[str, list]:
+        # merged version and contexts of all workers, the serving worker sends its list only when it changed
+        now = time.time()
+        version = output["contexts_version"]
+        if "contexts" in output:
+            self.contexts[no] = (now, version, output["contexts"])
+        stale = [
+            w
+            for w in range(len(self.workers))
+            if (w == no and self._get_cached(w)[1] != version)
+            or (w != no and now - self._get_cached(w)[0] > CONTEXTS_REFRESH)
+        ]
+        results = await asyncio.gather(
+            *[self.workers[w].call("contexts") for w in stale], return_exceptions=True
+        )
+        for w, result in zip(stale, results):
+            if not isinstance(result, BaseException):
+                self.contexts[w] = (now, result["version"], result["contexts"])
+                self._learn_owners(w, "contexts", "", result)
+        version = ".".join(self._get_cached(w)[1] for w in range(len(self.workers)))
+        return version, [ctx for w in range(len(self.workers)) for ctx in self._get_cached(w)[2]]
+
+    def _get_cached(self, no: int) -> tuple[float, str, list]:
+        return self.contexts.get(no, (0.0, "", []))
+
+
+def _get_ctxid(request: Request) -> str:
+    if request.is_json:
+        input = request.get_json(silent=True) or {}
+    else:
+        input = request.form
+    return input.get("context", "") or input.get("ctxid", "") or ""
+
+
+def _worker_main(no: int, count: int, conn, args: dict):
+    from flask import Flask
+    from werkzeug.test import EnvironBuilder
+    from python.helpers import runtime, dotenv, persist_chat, settings
+    from python.helpers.api import ApiHandler
+    from python.helpers.extract_tools import load_classes_from_folder
+    from python.api.poll import get_contexts_output, get_contexts_version
+
+    runtime.args = args
+    dotenv.load_dotenv()
+
+    app = Flask(f"worker-{no}")
+    lock = threading.Lock()
+    handlers: dict[str, ApiHandler] = {}
+    for handler in load_classes_from_folder("python/api", "*.py", ApiHandler):
+        name = handler.__module__.split(".")[-1]
+        if name in CONTEXT_HANDLERS:
+            handlers[name] = handler(app, lock)
+
+    # contexts of this worker from persisted chats
+    persist_chat.index_tmp_chats(lambda ctxid: get_worker_no(ctxid, count) == no)
+    PrintStyle().print(f"Worker {no} ready.")
+
+    send_lock = threading.Lock()
+
+    def respond(req_id: str, result: Any = None, error: str = ""):
+        with send_lock:
+            conn.send((req_id, result, error))
+
+    def handle_request(data: WorkerRequest) -> WorkerResponse:
+        environ = EnvironBuilder(
+            method=data.method,
+            path=data.path,
+            query_string=data.query,
+            headers=data.headers,
+            data=data.body,
+        ).get_environ()
+        with app.request_context(environ):
+            from flask import request
+
+            response = asyncio.run(
+                handlers[data.handler].handle_request(request=request)  # type: ignore
+            )
+        return WorkerResponse(
+            status=response.status_code,
+            headers=list(response.headers.items()),
+            body=response.get_data(),
+        )
+
+    def run(req_id: str, command: str, payload: Any):
+        try:
+            if command == "request":
+                result = handle_request(payload)
+            elif command == "contexts":
+                version = get_contexts_version()  # before the list, so the list is never older
+                result = {"version": version, "contexts": get_contexts_output()}
+            elif command == "reload_settings":
+                settings.reload_settings()
+                result = True
+            else:
+                raise Exception(f"Unknown worker command '{command}'")
+            respond(req_id, result)
+        except Exception as e:
+            respond(req_id, error=errors.format_error(e))
+
+    while True:
+        try:
+            req_id, command, payload = conn.recv()
+        except (EOFError, OSError):
+            break
+        if command == "stop":
+            break
+        # requests like /message wait for the agent, each gets its own thread
+        threading.Thread(
+            target=run, args=(req_id, command, payload), daemon=True
+        ).start()
+
+    # chats saved but not written yet
+    persist_chat.flush()
@@ -1,10 +1,19 @@
+import asyncio
 from agent import Agent, UserMessage
+from python.helpers import errors
 from python.helpers.tool import Tool, Response
 
+PARALLEL_LIMIT = 3  # subordinates of one fan-out running at the same time
+PARALLEL_TIMEOUT = 900  # default seconds for each fan-out subordinate
+
 
 class Delegation(Tool):
 
-    async def execute(self, message="", reset="", **kwargs):
+    async def execute(self, message="", reset="", messages=None, timeout="", **kwargs):
+        # independent subtasks go to several new subordinates at once
+        if messages and isinstance(messages, list):
+            return await self.fan_out([str(m) for m in messages], timeout)
+
         # create subordinate agent using the data object on this agent and set superior agent to his data object
         if (
             self.agent.get_data(Agent.DATA_NAME_SUBORDINATE) is None
@@ -23,3 +32,80 @@ class Delegation(Tool):
         result = await subordinate.monologue()
         # result
         return Response(message=result, break_loop=False)
+
+    async def fan_out(self, messages: list[str], timeout=""):
+        try:
+            timeout = float(timeout) if timeout else PARALLEL_TIMEOUT
+        except ValueError:
+            timeout = PARALLEL_TIMEOUT
+
+        limiter = asyncio.Semaphore(PARALLEL_LIMIT)
+        subordinates = [self.create_parallel(i) for i in range(len(messages))]
+        tasks = [
+            asyncio.create_task(self.run_parallel(sub, msg, timeout, limiter))
+            for sub, msg in zip(subordinates, messages)
+        ]
+
+        # the user keeps talking to this agent while its subordinates run, a message stops the fan-out
+        # so it is answered right away instead of after the slowest subtask, unfinished ones are cancelled
+        branches = asyncio.gather(*tasks, return_exceptions=True)
+        intervention = asyncio.create_task(
+            self.agent.context.wait_for_signal(lambda: bool(self.agent.intervention))
+        )
+        try:
+            await asyncio.wait(
+                [branches, intervention], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            intervention.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(branches, intervention, return_exceptions=True)
+
+        results = [
+            (
+                self.agent.read_prompt("fw.subordinate_interrupted.md")
+                if task.cancelled()
+                else task.result()
+            )
+            for task in tasks
+        ]
+
+        # results in the order of messages
+        result = "\n\n".join(
+            self.agent.read_prompt(
+                "fw.msg_from_subordinate.md", name=sub.agent_name, message=res
+            )
+            for sub, res in zip(subordinates, results)
+        )
+        return Response(message=result, break_loop=False)
+
+    def create_parallel(self, index: int) -> Agent:
+        # fan-out subordinates are transient, they are not part of the persisted agent chain
+        # and do not take over the streaming agent, so the chat always continues with this agent
+        sub = Agent(self.agent.number + 1, self.agent.config, self.agent.context)
+        sub.agent_name = f"{sub.agent_name}.{index + 1}"
+        sub.set_data(Agent.DATA_NAME_SUPERIOR, self.agent)
+        sub.set_data(Agent.DATA_NAME_PARALLEL, True)
+        return sub
+
+    async def run_parallel(
+        self, sub: Agent, message: str, timeout: float, limiter: asyncio.Semaphore
+    ) -> str:
+        async with limiter:
+            await sub.hist_add_user_message(UserMessage(message=message, attachments=[]))
+            task = asyncio.create_task(sub.monologue())
+            try:
+                done, pending = await asyncio.wait([task], timeout=timeout)
+                if pending:
+                    return self.agent.read_prompt(
+                        "fw.subordinate_timeout.md", timeout=int(timeout)
+                    )
+                return str(task.result())
+            except Exception as e:
+                return errors.error_text(e)
+            finally:
+                # timed out or this agent was stopped
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,246 @@
+import asyncio
+import functools
+import inspect
+import json
+import statistics
+import tempfile
+import threading
+import time
+from typing import Any, Callable
+
+import models
+from agent import Agent, AgentContext, ModelConfig, UserMessage
+from initialize import initialize
+from python.helpers import files, persist_chat, runtime
+from python.helpers.print_style import PrintStyle
+import python.helpers.log as Log
+
+# framework overhead benchmark, the agent talks to the offline model provider so only our own code is measured
+# usage: python run_benchmark.py --iterations=20 --ttft=0 --tps=0 --responses=path/to/script.json --output=result.json
+
+MEMORY_SUBDIR = "benchmark"
+DEFAULT_ITERATIONS = 10
+WARMUP_ITERATIONS = 1
+
+# one user turn: recall from memory, then answer
+CHAT_SCRIPT = [
+    json.dumps(
+        {
+            "thoughts": ["I should check my memory first."],
+            "tool_name": "memory_load",
+            "tool_args": {"query": "benchmark facts", "threshold": 0.1, "limit": 5},
+        }
+    ),
+    json.dumps(
+        {
+            "thoughts": ["I can answer now."],
+            "tool_name": "response",
+            "tool_args": {"text": "Benchmark answer. " * 20},
+        }
+    ),
+]
+# utility answers accepted by summaries, memory queries and memorization alike
+UTILITY_SCRIPT = ["[]"]
+
+timings: dict[str, list[float]] = {}
+timings_lock = threading.Lock()
+# what a client polling after every log update receives, with deltas and as whole items
+log_egress = {"updates": 0, "whole": 0, "delta_bytes": 0, "full_bytes": 0}
+
+
+def record(stage: str, seconds: float):
+    with timings_lock:
+        timings.setdefault(stage, []).append(seconds)
+
+
+def instrument(owner: Any, attr: str, stage: str | Callable[..., str]):
+    # wrap a method or function to record its duration, stage can be derived from call arguments
+    original = getattr(owner, attr)
+
+    def get_stage(args, kwargs):
+        return stage(*args, **kwargs) if callable(stage) else stage
+
+    if inspect.iscoroutinefunction(original):
+
+        @functools.wraps(original)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                record(get_stage(args, kwargs), time.perf_counter() - start)
+
+        setattr(owner, attr, async_wrapper)
+    else:
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                record(get_stage(args, kwargs), time.perf_counter() - start)
+
+        setattr(owner, attr, wrapper)
+
+
+def instrument_stages():
+    instrument(Agent, "monologue", "monologue")
+    instrument(Agent, "prepare_prompt", "prepare_prompt")
+    instrument(Agent, "call_chat_model", "call_chat_model")
+    instrument(Agent, "call_utility_model", "call_utility_model")
+    instrument(Agent, "process_tools", "process_tools")
+    instrument(Agent, "call_extensions", lambda self, folder, **kwargs: f"extensions/{folder}")
+    # chats are captured on the agent loop when the debounced save is due and written by the writer thread
+    instrument(persist_chat, "schedule_save", "persist_chat/schedule")
+    instrument(persist_chat, "save_tmp_chat", "persist_chat/capture")
+    instrument(persist_chat, "flush", "persist_chat/flush")
+    instrument_writes("persist_chat/write")
+    instrument(Log.Log, "log", "log")
+    instrument(Log.LogItem, "update", "log_update")
+
+
+def instrument_writes(stage: str):
+    # time every write where the background writer runs it
+    original = persist_chat._enqueue_write
+
+    @functools.wraps(original)
+    def enqueue_write(write: Callable[[], None]):
+        def timed_write():
+            start = time.perf_counter()
+            try:
+                write()
+            finally:
+                record(stage, time.perf_counter() - start)
+
+        original(timed_write)
+
+    persist_chat._enqueue_write = enqueue_write
+
+
+def measure_log_egress():
+    original = Log.LogItem.update
+
+    @functools.wraps(original)
+    def update(self, *args, **kwargs):
+        version = self.log.version
+        original(self, *args, **kwargs)
+        delta = self.output_delta(version)
+        with timings_lock:
+            log_egress["updates"] += 1
+            log_egress["whole"] += not delta.get("delta", False)  # streamed updates should be deltas
+            log_egress["delta_bytes"] += len(json.dumps(delta))
+            log_egress["full_bytes"] += len(json.dumps(self.output()))
+
+    Log.LogItem.update = update
+
+
+def get_config():
+    config = initialize()
+    offline_kwargs = {
+        "ttft": float(runtime.get_arg("ttft") or 0),
+        "tokens_per_second": float(runtime.get_arg("tps") or 0),
+    }
+    chat_kwargs = dict(offline_kwargs)
+    if runtime.get_arg("responses"):
+        chat_kwargs["responses_file"] = runtime.get_arg("responses")
+    else:
+        chat_kwargs["responses"] = CHAT_SCRIPT
+
+    config.chat_model = ModelConfig(
+        provider=models.ModelProvider.OFFLINE, name="offline-chat", kwargs=chat_kwargs
+    )
+    config.utility_model = ModelConfig(
+        provider=models.ModelProvider.OFFLINE,
+        name="offline-utility",
+        kwargs={**offline_kwargs, "responses": UTILITY_SCRIPT},
+    )
+    config.embeddings_model = ModelConfig(
+        provider=models.ModelProvider.OFFLINE, name="offline-embedding"
+    )
+    config.memory_subdir = MEMORY_SUBDIR
+    config.knowledge_subdirs = []  # knowledge import would dominate the first turns
+    config.code_exec_ssh_enabled = False
+    return config
+
+
+def get_report(total: float, iterations: int) -> dict:
+    report = {"iterations": iterations, "total": total, "stages": {}}
+    with timings_lock:
+        report["log_egress"] = dict(log_egress)
+        for stage, values in sorted(timings.items()):
+            values = sorted(values)
+            report["stages"][stage] = {
+                "calls": len(values),
+                "total": sum(values),
+                "mean": statistics.mean(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+    return report
+
+
+def print_report(report: dict):
+    PrintStyle(font_color="green", bold=True, padding=True).print(
+        f"{report['iterations']} iterations in {report['total']:.3f} s"
+    )
+    header = f"{'stage':<36}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+    PrintStyle(bold=True).print(header)
+    for stage, s in report["stages"].items():
+        PrintStyle().print(
+            f"{stage:<36}{s['calls']:>8}{s['total'] * 1000:>12.2f}{s['mean'] * 1000:>10.2f}"
+            f"{s['p50'] * 1000:>10.2f}{s['p95'] * 1000:>10.2f}{s['max'] * 1000:>10.2f}"
+        )
+    egress = report["log_egress"]
+    PrintStyle().print(
+        f"log updates: {egress['updates']}, delta bytes: {egress['delta_bytes']}, full bytes: {egress['full_bytes']}"
+    )
+    if egress["whole"]:
+        PrintStyle.error(f"{egress['whole']} log updates were sent as whole items instead of deltas.")
+
+
+async def benchmark(iterations: int):
+    context = AgentContext(get_config())
+    try:
+        for i in range(WARMUP_ITERATIONS + iterations):
+            if i == WARMUP_ITERATIONS:
+                with timings_lock:
+                    timings.clear()  # model clients, memory and prompts are loaded by now
+                    log_egress.update(dict.fromkeys(log_egress, 0))
+                start = time.perf_counter()
+            turn_start = time.perf_counter()
+            await context.communicate(UserMessage(f"Benchmark message {i}.", [])).result()
+            record("communicate", time.perf_counter() - turn_start)
+        return time.perf_counter() - start  # type: ignore
+    finally:
+        AgentContext.remove(context.id)
+
+
+def run():
+    runtime.initialize()
+    iterations = max(1, int(runtime.get_arg("iterations") or DEFAULT_ITERATIONS))
+
+    # start from an empty memory so runs are comparable
+    files.delete_dir(f"memory/{MEMORY_SUBDIR}")
+    instrument_stages()
+    measure_log_egress()  # after the stages so its cost is not timed
+
+    # the benchmark chat is saved like any other, but never among the user's chats, even if the run is killed
+    with tempfile.TemporaryDirectory(prefix="a0-benchmark-chats-") as chats_folder:
+        persist_chat.CHATS_FOLDER = chats_folder
+        try:
+            total = asyncio.run(benchmark(iterations))
+        finally:
+            persist_chat.flush()  # pending writes go to the temporary folder before it is deleted
+    report = get_report(total, iterations)
+    print_report(report)
+
+    output = runtime.get_arg("output")
+    if output:
+        files.write_file(output, json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    PrintStyle.standard("Running framework benchmark with the offline model provider...")
+    run()
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import re
+import statistics
+import time
+
+from agent import AgentContext
+from python.helpers import extractive_summary, files, history, persist_chat, runtime
+from python.helpers.print_style import PrintStyle
+
+# history compression benchmark, extractive local summaries against the utility model on saved chats
+# usage: python run_summary_benchmark.py --topics=20 --output=result.json
+
+DEFAULT_TOPICS = 20
+MIN_TOPIC_MESSAGES = 3
+
+_WORD = re.compile(r"\w+")
+
+
+def get_topics(limit: int) -> list[tuple[AgentContext, history.Topic]]:
+    result = []
+    for ctxid in persist_chat.load_tmp_chats():
+        context = AgentContext.get(ctxid)
+        if not context:
+            continue
+        agent = context.agent0
+        for topic in [*agent.history.topics, agent.history.current]:
+            if len(topic.messages) >= MIN_TOPIC_MESSAGES:
+                result.append((context, topic))
+            if len(result) >= limit:
+                return result
+    return result
+
+
+def unigram_f1(candidate: str, reference: str) -> float:
+    # word overlap of the two summaries, a cheap stand-in for ROUGE-1
+    cand = set(_WORD.findall(candidate.lower()))
+    ref = set(_WORD.findall(reference.lower()))
+    if not cand or not ref:
+        return 0.0
+    common = len(cand & ref)
+    if not common:
+        return 0.0
+    precision, recall = common / len(cand), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def key_value_retention(text: str, summary: str) -> float:
+    # share of key-value facts of the original whose value survives in the summary
+    facts = extractive_summary.extract_key_values(text)
+    if not facts:
+        return 1.0
+    return sum(1 for _, value, _ in facts if value in summary) / len(facts)
+
+
+def get_stats(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "mean": statistics.mean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+async def summarize_llm(agent, text: str) -> str:
+    # straight to the model, the summary cache would turn repeated runs into lookups
+    system = agent.read_prompt("fw.topic_summary.sys.md")
+    message = agent.read_prompt("fw.topic_summary.msg.md", content=text)
+    return await agent.call_utility_model(system=system, message=message)
+
+
+async def benchmark(limit: int) -> dict:
+    topics = get_topics(limit)
+    samples = []
+    for context, topic in topics:
+        text = topic.output_text()
+
+        start = time.perf_counter()
+        local = extractive_summary.summarize(text, history.SUMMARY_TO_TOPIC_RATIO)
+        local_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        llm = await summarize_llm(context.agent0, text)
+        llm_time = time.perf_counter() - start
+
+        samples.append(
+            {
+                "chat": context.id,
+                "length": len(text),
+                "local": {
+                    "seconds": local_time,
+                    "ratio": len(local) / max(len(text), 1),
+                    "key_values": key_value_retention(text, local),
+                },
+                "llm": {
+                    "seconds": llm_time,
+                    "ratio": len(llm) / max(len(text), 1),
+                    "key_values": key_value_retention(text, llm),
+                },
+                "f1_vs_llm": unigram_f1(local, llm),
+            }
+        )
+
+    report: dict = {"topics": len(samples), "samples": samples}
+    if samples:
+        for mode in ("local", "llm"):
+            report[mode] = {
+                "seconds": get_stats([s[mode]["seconds"] for s in samples]),
+                "ratio": statistics.mean(s[mode]["ratio"] for s in samples),
+                "key_values": statistics.mean(s[mode]["key_values"] for s in samples),
+            }
+        report["f1_vs_llm"] = statistics.mean(s["f1_vs_llm"] for s in samples)
+    return report
+
+
+def print_report(report: dict):
+    if not report["topics"]:
+        PrintStyle.error(f"No saved chat topics with {MIN_TOPIC_MESSAGES}+ messages found in tmp/chats.")
+        return
+    PrintStyle(font_color="green", bold=True, padding=True).print(
+        f"{report['topics']} topics summarized"
+    )
+    header = f"{'mode':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'ratio':>8}{'kv kept':>9}"
+    PrintStyle(bold=True).print(header)
+    for mode in ("local", "llm"):
+        s = report[mode]
+        t = s["seconds"]
+        PrintStyle().print(
+            f"{mode:<10}{t['mean'] * 1000:>10.2f}{t['p50'] * 1000:>10.2f}{t['p95'] * 1000:>10.2f}"
+            f"{t['max'] * 1000:>10.2f}{s['ratio']:>8.2f}{s['key_values']:>9.2f}"
+        )
+    PrintStyle().print(f"unigram F1 of local against llm summaries: {report['f1_vs_llm']:.3f}")
+
+
+def run():
+    runtime.initialize()
+    limit = max(1, int(runtime.get_arg("topics") or DEFAULT_TOPICS))
+
+    report = asyncio.run(benchmark(limit))
+    print_report(report)
+
+    output = runtime.get_arg("output")
+    if output:
+        files.write_file(output, json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    PrintStyle.standard("Running history summary benchmark on saved chats...")
+    run()
@@ -5,7 +5,7 @@ from flask import Flask, request, Response
 from flask_basicauth import BasicAuth
 from python.helpers import errors, files, git
 from python.helpers.files import get_abs_path
-from python.helpers import persist_chat, runtime, dotenv, process
+from python.helpers import persist_chat, runtime, dotenv, process, workers
 from python.helpers.cloudflare_tunnel import CloudflareTunnel
 from python.helpers.extract_tools import load_classes_from_folder
 from python.helpers.api import ApiHandler
@@ -86,7 +86,13 @@ def run():
         or dotenv.get_dotenv_value("USE_CLOUDFLARE", "false").lower()
     ) == "true"
 
+    # agent contexts run in worker processes if set
+    workers_count = int(
+        runtime.get_arg("workers") or dotenv.get_dotenv_value("WEB_UI_WORKERS", 0) or 0
+    )
+
     tunnel = None
+    pool: workers.WorkerPool | None = None
 
     try:
         # Initialize and start Cloudflare tunnel if enabled
@@ -98,8 +104,13 @@ def run():
                 PrintStyle().error(f"Failed to start Cloudflare tunnel: {e}")
                 PrintStyle().print("Continuing without tunnel...")
 
-        # initialize contexts from persisted chats
-        persist_chat.load_tmp_chats()
+        if workers_count > 0:
+            # workers load their own share of persisted chats
+            pool = workers.WorkerPool(workers_count)
+            process.set_workers(pool)
+        else:
+            # list persisted chats, each is loaded when first used
+            persist_chat.index_tmp_chats()
 
     except Exception as e:
         PrintStyle().error(errors.format_error(e))
@@ -112,7 +123,13 @@ def run():
 
         @requires_auth
         async def handle_request():
-            return await instance.handle_request(request=request)
+            # context bound requests are served by the worker owning the context
+            if pool and name in workers.CONTEXT_HANDLERS:
+                return await pool.forward(name, request)
+            response = await instance.handle_request(request=request)
+            if pool and name in workers.SETTINGS_HANDLERS:
+                await pool.broadcast("reload_settings")
+            return response
 
         app.add_url_rule(
             f"/{name}",
@@ -145,6 +162,9 @@ def run():
         # Clean up tunnel if it was started
         if tunnel:
             tunnel.stop()
+        # stop worker processes
+        if pool:
+            pool.stop()
 
 
 # run the internal server
@@ -0,0 +1,84 @@
+import random
+import unittest
+
+from python.helpers.dirty_json import DirtyJson
+
+# inputs covering the quirks of parse_string: literals read as text, unquoted values, {{ }}, comments, cut off input
+CASES = [
+    '{"a": true}', '{"a": null}', '{"a": undefined}', '{"a": }', '{"a": ,"b":1}', '{"a": "x"} trailing',
+    '{"a": "x"', '{a: hello world}', '[1, 2, ]', '[true, null]', '[a, b]', '{"a": [1, "x", {b: c}]}',
+    '{"a": 1.5e3, "b": -2}', '{"a": 1.2.3}', '{"a": -}', '{"a": +5}', '{{"a": 1}}', '{"a": "b"}}',
+    'text {"a": "b"} more', '{"a": """ multi\nline """}', '{"a": "x\\ny\\u0041"}', '{"a": "\\u00zz"}',
+    "{'a': 'b'}", '{"a": `t`}', '{"a": // c\n 1}', '{"a": /* c */ 2}', '', 'plain', '"abc" def', '[', '{',
+    '{"a"', '{"a":', '{"a": tru', '{"a": [1, 2', '{"a": "b", }', '{"a": {"b": [}]}',
+    '{"thoughts": ["x", "y"], "tool_name": "response", "tool_args": {"text": "done \\"here\\""}}',
+]
+TOKENS = ['{', '}', '[', ']', '"', "'", '`', ':', ',', ' ', '\n', 'a', 'b', '1', '-', '.', 'e', 'true', 'null',
+          '\\', 'u', '0041', '/', '*', '//', '{{', '}}', '"""', 'x y', '\\n']
+
+
+def parse(text: str) -> str:
+    try:
+        return repr(DirtyJson.parse_string(text))
+    except Exception as e:
+        return "error " + type(e).__name__
+
+
+def feed(text: str, rnd: random.Random) -> str:
+    parser = DirtyJson()
+    try:
+        i = 0
+        while i < len(text):
+            size = rnd.randint(1, 5)
+            parser.feed(text[i : i + size])
+            i += size
+        return repr(parser.finish())
+    except Exception as e:
+        return "error " + type(e).__name__
+
+
+class TestDirtyJsonFeed(unittest.TestCase):
+    def test_matches_parse_string(self):
+        rnd = random.Random(0)
+        for text in CASES:
+            for _ in range(5):
+                self.assertEqual(feed(text, rnd), parse(text), text)
+
+    def test_matches_parse_string_random(self):
+        rnd = random.Random(1)
+        for _ in range(3000):
+            text = "".join(rnd.choice(TOKENS) for _ in range(rnd.randint(0, 25)))
+            self.assertEqual(feed(text, rnd), parse(text), text)
+
+    def test_result_is_live(self):
+        parser = DirtyJson()
+        parser.feed('{"tool_name": "resp')
+        self.assertEqual(parser.result, {"tool_name": "resp"})
+        parser.feed('onse", "tool_args": {"text": "hi"}}')
+        self.assertTrue(parser.closed)
+        self.assertFalse(parser.done)  # parse_string reads on after "}}"
+        self.assertEqual(parser.result, {"tool_name": "response", "tool_args": {"text": "hi"}})
+        self.assertEqual(parser.end, len('{"tool_name": "response", "tool_args": {"text": "hi"}}'))
+
+    def test_closed_after_lookahead(self):
+        parser = DirtyJson()
+        parser.feed('{"tool_name": "response"}')
+        self.assertFalse(parser.closed)  # "}" may still be followed by another one
+        parser.feed("\nafter")
+        self.assertTrue(parser.done and parser.closed)
+        self.assertEqual(parser.end, len('{"tool_name": "response"}'))
+
+    def test_copy_result(self):
+        parser = DirtyJson()
+        parser.feed('{"thoughts": ["a", "b"], "text": "xy')
+        first = parser.copy_result()
+        parser.feed('z", "more": [1')
+        second = parser.copy_result(first)
+        self.assertEqual(first, {"thoughts": ["a", "b"], "text": "xy"})
+        self.assertEqual(second, {"thoughts": ["a", "b"], "text": "xyz", "more": [1]})
+        self.assertIs(second["thoughts"], first["thoughts"])
+        self.assertIsNot(second["more"], parser.result["more"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from python.helpers import extractive_summary
+
+
+class TestSummarize(unittest.TestCase):
+    def test_long_first_sentence_is_cut_to_the_budget(self):
+        text = (
+            "This one sentence goes on about deploying the service to the cluster "
+            "and keeps going without a single break until it is far longer than any budget."
+        )
+        summary = extractive_summary.summarize(text, ratio=0.2)
+        self.assertLessEqual(len(summary), int(len(text) * 0.2))
+        self.assertTrue(summary.endswith(extractive_summary.TRUNCATION_MARK))
+        self.assertTrue(text.startswith(summary[: -len(extractive_summary.TRUNCATION_MARK)]))
+
+    def test_sentences_within_budget_are_kept_whole(self):
+        text = "The build failed on step three. " * 2 + "Logs were uploaded for review by the team."
+        summary = extractive_summary.summarize(text, ratio=0.9)
+        self.assertNotIn(extractive_summary.TRUNCATION_MARK, summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+from python.helpers import history, tokens
+
+
+class TestCompressTopics(unittest.TestCase):
+    def setUp(self):
+        self.estimator = tokens.get_estimator()
+        tokens.register_estimator("words", lambda text: len(text.split()))
+        tokens.set_estimator("words")
+
+    def tearDown(self):
+        tokens.set_estimator(self.estimator)
+
+    def create_history(self, topics: int) -> history.History:
+        hist = history.History(agent=None)
+        for i in range(topics):
+            hist.add_message(False, f"question {i}")
+            hist.current.summary = " ".join(["word"] * 100)
+            hist.new_topic()
+        return hist
+
+    def test_moves_oldest_topics_for_the_excess(self):
+        hist = self.create_history(4)
+        topics = list(hist.topics)
+        tokens_per_topic = topics[0].get_tokens()
+
+        self.assertTrue(asyncio.run(hist.compress_topics(excess=tokens_per_topic * 1.5)))
+        self.assertEqual([bulk.records[0] for bulk in hist.bulks], topics[:2])
+        self.assertEqual(hist.topics, topics[2:])
+        self.assertEqual(hist.bulks[0].summary, topics[0].summary)
+
+    def test_moves_one_topic_without_excess(self):
+        hist = self.create_history(3)
+        topics = list(hist.topics)
+        self.assertTrue(asyncio.run(hist.compress_topics()))
+        self.assertEqual(len(hist.bulks), 1)
+        self.assertEqual(hist.topics, topics[1:])
+
+    def test_nothing_to_move(self):
+        hist = self.create_history(0)
+        self.assertFalse(asyncio.run(hist.compress_topics(excess=10)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from python.helpers.log import Log
+
+
+class TestChangedSince(unittest.TestCase):
+    def setUp(self):
+        self.log = Log()
+        self.items = [self.log.log(type="info", content=f"item {i}") for i in range(4)]
+
+    def test_items_in_log_order(self):
+        version = self.log.version
+        self.items[2].update(content="changed 2")
+        self.items[0].update(content="changed 0")
+        self.items[3].update(content="changed 3")
+
+        changed = self.log.changed_since(version)
+        self.assertEqual([item.no for item in changed], [0, 2, 3])
+        self.assertEqual([item["no"] for item in self.log.output(version)], [0, 2, 3])
+
+    def test_all_items_after_updates(self):
+        self.items[1].update(content="changed 1")
+        self.assertEqual([item.no for item in self.log.changed_since(0)], [0, 1, 2, 3])
+
+    def test_until_version(self):
+        version = self.log.version
+        self.items[3].update(content="changed 3")
+        until = self.log.version
+        self.items[1].update(content="changed 1")
+        self.assertEqual([item.no for item in self.log.changed_since(version, until)], [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
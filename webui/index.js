@@ -296,13 +296,14 @@ function adjustTextareaHeight() {
     chatInput.style.height = (chatInput.scrollHeight) + 'px';
 }
 
-export const sendJsonData = async function (url, data) {
+export const sendJsonData = async function (url, data, signal) {
     const response = await fetch(url, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify(data)
+        body: JSON.stringify(data),
+        signal
     });
 
     if (!response.ok) {
@@ -335,11 +336,43 @@ function setConnectionStatus(connected) {
 let lastLogVersion = 0;
 let lastLogGuid = ""
 let lastSpokenNo = 0
+let logItems = {} // log items by no, as of lastLogVersion, server sends only what changed
+let lastPaused = null
+let lastProgress = null
+let lastProgressActive = null
+let lastContextsVersion = null // the server sends the chats list only when it changed since
+let lastPollEtag = ""
+let pollAbort = null // pending long poll, aborted when the chat changes
 
 async function poll() {
     let updated = false
     try {
-        const response = await sendJsonData("/poll", { log_from: lastLogVersion, context });
+        // the server answers once something changed after what we have, or after its wait timeout
+        pollAbort = new AbortController()
+        const fetchResponse = await fetch("/poll_wait", {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'If-None-Match': lastPollEtag
+            },
+            body: JSON.stringify({
+                log_from: lastLogVersion,
+                log_guid: lastLogGuid,
+                paused: lastPaused,
+                log_progress: lastProgress,
+                log_progress_active: lastProgressActive,
+                contexts_version: lastContextsVersion,
+                log_deltas: true,
+                context
+            }),
+            signal: pollAbort.signal
+        });
+        if (fetchResponse.status == 304) {
+            setConnectionStatus(true) // same answer as last time, nothing new
+            return updated
+        }
+        if (!fetchResponse.ok) throw new Error(await fetchResponse.text());
+        const response = await fetchResponse.json();
         //console.log(response)
 
         if (!context) setContext(response.context)
@@ -348,15 +381,17 @@ async function poll() {
         if (lastLogGuid != response.log_guid) {
             chatHistory.innerHTML = ""
             lastLogVersion = 0
+            logItems = {}
         }
 
         if (lastLogVersion != response.log_version) {
             updated = true
-            for (const log of response.logs) {
+            const logs = response.logs.map(mergeLogItem)
+            for (const log of logs) {
                 const messageId = log.id || log.no; // Use log.id if available
                 setMessage(messageId, log.type, log.heading, log.content, log.temp, log.kvps);
             }
-            afterMessagesUpdate(response.logs)
+            afterMessagesUpdate(logs)
         }
 
         updateProgress(response.log_progress, response.log_progress_active)
@@ -368,20 +403,73 @@ async function poll() {
         // Update status icon state
         setConnectionStatus(true)
 
-        const chatsAD = Alpine.$data(chatsSection);
-        chatsAD.contexts = response.contexts;
+        if (response.contexts) {
+            const chatsAD = Alpine.$data(chatsSection);
+            chatsAD.contexts = response.contexts;
+            lastContextsVersion = response.contexts_version;
+        }
 
         lastLogVersion = response.log_version;
         lastLogGuid = response.log_guid;
+        lastPaused = response.paused;
+        lastProgress = response.log_progress;
+        lastProgressActive = response.log_progress_active;
+        lastPollEtag = fetchResponse.headers.get("ETag") || ""
 
     } catch (error) {
+        if (error.name == "AbortError") return updated // replaced by a poll for the new state
         console.error('Error:', error);
         setConnectionStatus(false)
+        throw error
     }
 
     return updated
 }
 
+function refreshPoll() {
+    // answer the pending long poll now, the next one picks up the change
+    if (pollAbort) pollAbort.abort()
+}
+
+function mergeLogItem(log) {
+    // delta items leave out unchanged fields and carry what was appended, with the shape of our copy in offsets
+    const known = logItems[log.no]
+    if (!log.delta || !known) {
+        logItems[log.no] = log
+        return log
+    }
+    const offsets = log.offsets || {}
+    const merge = (prev, value, offset) => offset === undefined ? value : mergeTail(prev, offset, value)
+    const merged = { ...known, type: log.type, temp: log.temp, id: log.id }
+    for (const key of ["heading", "content"]) {
+        if (key in log) merged[key] = merge(known[key], log[key], offsets[key])
+    }
+    if (log.kvps) {
+        const kvpsOffsets = offsets.kvps || {}
+        merged.kvps = { ...(known.kvps || {}) }
+        for (const [key, value] of Object.entries(log.kvps)) {
+            merged.kvps[key] = merge(merged.kvps[key], value, kvpsOffsets[key])
+        }
+    }
+    logItems[log.no] = merged
+    return merged
+}
+
+function mergeTail(prev, shape, tail) {
+    // shape is the length of text, [length, shape of the last item] of lists and objects
+    if (typeof shape == "number") return (prev || "").substring(0, shape) + tail
+    if (!shape) return tail
+    const [length, last] = shape
+    if (Array.isArray(prev)) {
+        const merged = prev.slice(0, length)
+        if (length) merged[length - 1] = mergeTail(merged[length - 1], last, tail.last)
+        return merged.concat(tail.items)
+    }
+    const merged = { ...prev }
+    if (length) merged[tail.key] = mergeTail(merged[tail.key], last, tail.last)
+    return Object.assign(merged, tail.items)
+}
+
 function afterMessagesUpdate(logs) {
     if (localStorage.getItem('speech') == 'true') {
         speakMessages(logs)
@@ -460,7 +548,10 @@ window.killChat = async function (id) {
             else setContext(generateGUID())
         }
 
-        if (found) sendJsonData("/chat_remove", { context: id });
+        if (found) {
+            await sendJsonData("/chat_remove", { context: id });
+            refreshPoll()
+        }
 
         updateAfterScroll()
 
@@ -479,7 +570,12 @@ export const setContext = function (id) {
     context = id
     lastLogGuid = ""
     lastLogVersion = 0
+    lastPaused = null
+    lastProgress = null
+    lastProgressActive = null
+    lastPollEtag = ""
     lastSpokenNo = 0
+    refreshPoll()
     const chatsAD = Alpine.$data(chatsSection);
     chatsAD.selected = id
 }
@@ -628,6 +724,7 @@ window.loadChats = async function () {
         // } 
         else {
             setContext(response.ctxids[0])
+            refreshPoll()
             toast("Chats loaded.", "success")
         }
 
@@ -846,21 +943,16 @@ chatInput.addEventListener('input', adjustTextareaHeight);
 // setInterval(poll, 250);
 
 async function startPolling() {
-    const shortInterval = 25
-    const longInterval = 250
-    const shortIntervalPeriod = 100
-    let shortIntervalCount = 0
+    const interval = 25 // batches fast streaming updates into fewer requests
+    const retryInterval = 1000
 
     async function _doPoll() {
-        let nextInterval = longInterval
+        let nextInterval = interval
 
         try {
-            const result = await poll();
-            if (result) shortIntervalCount = shortIntervalPeriod; // Reset the counter when the result is true
-            if (shortIntervalCount > 0) shortIntervalCount--; // Decrease the counter on each call
-            nextInterval = shortIntervalCount > 0 ? shortInterval : longInterval;
+            await poll(); // waits on the server until there is something new
         } catch (error) {
-            console.error('Error:', error);
+            nextInterval = retryInterval
         }
 
         // Call the function again after the selected interval